@@ -1,48 +1,92 @@
 # https://adventofcode.com/2021/day/10
-import re
-from statistics import median_low
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
 
 from utils.utils import get_input_path
 
+# Closing character of each opening character
+MATCHING_CLOSE = {"(": ")", "[": "]", "{": "}", "<": ">"}
+# Error score of each closing character, and autocomplete score of each opening character
+ERROR_SCORES = {")": 3, "]": 57, "}": 1197, ">": 25137}
+AUTOCOMPLETE_SCORES = {"(": 1, "[": 2, "{": 3, "<": 4}
 
-def syntax_error_score(input_path: str, first_puzzle: bool) -> int:
-    """ For the first puzzle, calculate the error score by finding the first incorrect closing character on corrupted
-    lines.
-    For the second puzzle calculate the autocomplete score for incomplete lines, corrupt lines are ignored.
+
+def base_5_value(digits: List[int]) -> int:
+    """ Calculate the value of base 5 digits, most significant digit first.
+    The digits are split in halves which are combined as high * 5^len(low) + low, so multiplying huge numbers
+    uses the fast multiplication of Python integers, instead of multiplying by 5 once per digit.
+
+    :param digits: Base 5 digits
+    :return: The value of the digits
+    """
+    if len(digits) <= 64:
+        value = 0
+        for digit in digits:
+            value = value * 5 + digit
+        return value
+    middle = len(digits) // 2
+    return base_5_value(digits[:middle]) * 5 ** (len(digits) - middle) + base_5_value(digits[middle:])
+
+
+def check_line(line: str) -> Tuple[int, Optional[int]]:
+    """ Scan a line once, pushing opening characters on a stack and popping them on the matching closing character.
+    A closing character which does not match the top of the stack is the first incorrect character of a corrupted line.
+    The opening characters left on the stack of an incomplete line are closed in reverse order to complete it.
+
+    :param line: Line of chunks
+    :return: The error score and autocomplete score of the line, autocomplete score is None for corrupted lines
+    """
+    stack = []
+    for char in line:
+        if char in MATCHING_CLOSE:
+            stack.append(char)
+        elif not stack or MATCHING_CLOSE[stack.pop()] != char:
+            return ERROR_SCORES[char], None
+    return 0, base_5_value([AUTOCOMPLETE_SCORES[char] for char in reversed(stack)])
+
+
+def syntax_error_scores(input_path: str) -> Tuple[int, Optional[int]]:
+    """ Calculate the error score by finding the first incorrect closing character on corrupted lines, and the
+    autocomplete score for incomplete lines in the same pass.
+    The middle autocomplete score is selected without sorting all scores.
 
     :param input_path: File path of input data
-    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
-    :return: The error score (1st puzzle) or middle autocomplete score (2nd puzzle)
+    :return: The error score and middle autocomplete score, which is None if there are no incomplete lines
     """
     with open(input_path, "r") as f:
         lines = f.read().splitlines()
 
-    # Create maps with error and autocomplete scores
-    error_map = {")": 3, "]": 57, "}": 1197, ">": 25137}
-    autocomplete_map = {"(": 1, "[": 2, "{": 3, "<": 4}
-
     error_score = 0
     autocomplete_scores = []
     for line in lines:
-        # Strip pairs of opening and closing chars, until none are left
-        no_sub = True
-        while no_sub > 0:
-            line, no_sub = re.subn("<>|\[\]|\{\}|\(\)", "", line)
-
-        # Find the first closing character, this is the incorrect one
-        match = re.search(">|\}|\)|\]", line)
-
-        # Calculate the error score for first puzzle
-        if match:
-            error_score += error_map[match.group(0)]
-        # Calculate the autocomplete score for second puzzle
-        else:
-            line_score = 0
-            for char in line[::-1]:
-                line_score = (line_score * 5) + autocomplete_map[char]
-            autocomplete_scores.append(line_score)
-
-    score = error_score if first_puzzle else median_low(autocomplete_scores)
+        line_error_score, autocomplete_score = check_line(line)
+        error_score += line_error_score
+        if autocomplete_score is not None:
+            autocomplete_scores.append(autocomplete_score)
+
+    if not autocomplete_scores:
+        return error_score, None
+    # Middle score, lower one for an even number of scores
+    middle = (len(autocomplete_scores) - 1) // 2
+    return error_score, np.partition(np.array(autocomplete_scores, dtype=object), middle)[middle]
+
+
+def syntax_error_score(input_path: str, first_puzzle: bool) -> int:
+    """ For the first puzzle, calculate the error score by finding the first incorrect closing character on corrupted
+    lines.
+    For the second puzzle calculate the autocomplete score for incomplete lines, corrupt lines are ignored.
+
+    :param input_path: File path of input data
+    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
+    :return: The error score (1st puzzle) or middle autocomplete score (2nd puzzle)
+    """
+    error_score, autocomplete_score = syntax_error_scores(input_path)
+    if not first_puzzle and autocomplete_score is None:
+        raise ValueError("There are no incomplete lines to autocomplete")
+    score = error_score if first_puzzle else autocomplete_score
     return score
 
 
@@ -63,6 +107,22 @@ def main():
     second_answer = syntax_error_score(file_path, first_puzzle=False)
     assert second_answer == 4245130838
 
+    # Without incomplete lines there is only an error score
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corrupted_file_path = os.path.join(temp_dir, "10.txt")
+        with open(corrupted_file_path, "w") as f:
+            f.write("(]\n{()()()>\n")
+        assert syntax_error_score(corrupted_file_path, first_puzzle=True) == 57 + 25137
+        try:
+            syntax_error_score(corrupted_file_path, first_puzzle=False)
+            raise AssertionError("There is no autocomplete score without incomplete lines")
+        except ValueError:
+            pass
+
+    # Deeply nested lines take linear time
+    assert check_line("(" * 10 ** 6 + ")" * (10 ** 6 - 1) + "]") == (57, None)
+    assert check_line("<" * 10 ** 5) == (0, (5 ** 10 ** 5 - 1) // (5 - 1) * 4)
+
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,115 @@
 # https://adventofcode.com/2021/day/11
+from typing import Optional, Tuple
+
 import numpy as np
 
 from utils.utils import get_input_path
 
 
+def count_flashing_neighbors(flashing: np.array, padded: np.array) -> np.array:
+    """Count the flashing neighbors of each octopus with a 3x3 convolution, split into a sum over 3 columns and a sum
+    over 3 rows, minus the octopus itself.
+
+    :param flashing: Boolean mask of flashing octopuses, for a grid or a stack of grids
+    :param padded: Buffer for the mask with a border of zeros, 2 rows and columns larger than the mask
+    :return: Number of flashing neighbors for each octopus
+    """
+    padded[..., 1:-1, 1:-1] = flashing
+    columns = padded[..., :-2] + padded[..., 1:-1] + padded[..., 2:]
+    return columns[..., :-2, :] + columns[..., 1:-1, :] + columns[..., 2:, :] - padded[..., 1:-1, 1:-1]
+
+
+def simulate_step(levels: np.array) -> np.array:
+    """Simulate a step of the octopus' energy levels in place, for a grid or a stack of grids.
+    All energy levels increase by 1, then octopuses with a level above 9 flash in rounds. Each round, the number of
+    flashing neighbors of each octopus is added to its energy level. Grids without flashing octopuses are left out of
+    the next rounds. Finally the energy levels of all octopuses that flashed are set to 0.
+
+    :param levels: Energy levels of a 2D grid, or a 3D array with a stack of 2D grids
+    :return: Boolean mask of the octopuses that flashed
+    """
+    # Work on a stack of grids, which is a subset of the grids once some of them stop flashing
+    stack_levels = levels.reshape((-1,) + levels.shape[-2:])
+    stack_levels += 1
+    stack_flashed = np.zeros(stack_levels.shape, dtype=bool)
+    grids, grids_levels, grids_flashed = np.arange(len(stack_levels)), stack_levels, stack_flashed
+    padded = np.zeros((len(grids), levels.shape[-2] + 2, levels.shape[-1] + 2), dtype=levels.dtype)
+
+    flashing = grids_levels > 9
+    while grids.size:
+        active = flashing.any(axis=(1, 2))
+        if not active.all():
+            # Store the levels of the subset and continue with the grids that are still flashing
+            if grids_levels is not stack_levels:
+                stack_levels[grids], stack_flashed[grids] = grids_levels, grids_flashed
+            grids, grids_levels, grids_flashed = grids[active], grids_levels[active], grids_flashed[active]
+            flashing, padded = flashing[active], padded[: active.sum()]
+            continue
+
+        grids_flashed |= flashing
+        grids_levels += count_flashing_neighbors(flashing, padded)
+        flashing = grids_levels > 9
+        flashing &= ~grids_flashed
+
+    stack_levels[stack_flashed] = 0
+    # Reshaping copies arrays that are not contiguous, so copy the levels back into those
+    if not np.shares_memory(stack_levels, levels):
+        levels[...] = stack_levels.reshape(levels.shape)
+    return stack_flashed.reshape(levels.shape)
+
+
+def simulate_grids(levels: np.array, steps: int) -> Tuple[np.array, np.array]:
+    """Simulate a stack of grids with octopus' energy levels at once, in place.
+
+    :param levels: 3D array with a stack of 2D grids of energy levels
+    :param steps: Number of steps to simulate
+    :return: The total number of flashes for each grid and the first step all octopuses of each grid flashed in
+        sync (0 if they did not)
+    """
+    total_flashes = np.zeros(len(levels), dtype=np.int64)
+    sync_steps = np.zeros(len(levels), dtype=np.int64)
+    for step in range(1, steps + 1):
+        flashed = simulate_step(levels)
+        total_flashes += flashed.sum(axis=(1, 2))
+        sync_steps[(sync_steps == 0) & flashed.all(axis=(1, 2))] = step
+    return total_flashes, sync_steps
+
+
+def count_flashes_long(levels: np.array, steps: int) -> Tuple[int, Optional[int]]:
+    """Count the total number of flashes after any number of steps, and the first step all octopuses flash in sync.
+    The number of possible energy level grids is finite, so the grid ends up in a cycle of states. Each step the grid
+    is stored with the step number, until a grid repeats. The flashes of the remaining steps are then extrapolated
+    from the number of flashes in the cycle, so only the steps before the cycle and a single cycle are simulated.
+
+    :param levels: Energy levels of a 2D grid, updated in place
+    :param steps: Number of steps
+    :return: The total number of flashes and the first step all octopuses flashed in sync (None if not within steps)
+    """
+    # Total number of flashes after each step and step of each grid state seen so far
+    total_flashes = [0]
+    seen_steps = {levels.tobytes(): 0}
+    sync_step = None
+    for step in range(1, steps + 1):
+        flashed = simulate_step(levels)
+        total_flashes.append(total_flashes[-1] + np.count_nonzero(flashed))
+        if sync_step is None and flashed.all():
+            sync_step = step
+
+        state = levels.tobytes()
+        if state in seen_steps:
+            # Extrapolate the total number of flashes over the cycle
+            cycle_start = seen_steps[state]
+            cycle_length = step - cycle_start
+            no_cycles, remaining_steps = divmod(steps - cycle_start, cycle_length)
+            cycle_flashes = total_flashes[step] - total_flashes[cycle_start]
+            flashes = total_flashes[cycle_start + remaining_steps] + no_cycles * cycle_flashes
+            # All states have been seen once the cycle is found, so the octopuses never sync if they did not yet
+            return flashes, sync_step
+        seen_steps[state] = step
+
+    return total_flashes[-1], sync_step
+
+
 def track_flashes(input_path: str, first_puzzle: bool) -> int:
     """Keeps track of octopus' energy levels in a 2D numpy array.
     For the first puzzle it counts the total number of flashes that have occurred after 100 steps.
@@ -13,36 +119,12 @@ def track_flashes(input_path: str, first_puzzle: bool) -> int:
     :param first_puzzle: Whether the answer for the first or second puzzle is calculated
     :return: The total number of flashes after 100 steps (1st puzzle) or steps until octopuses are in sync (2nd puzzle)
     """
-    levels = np.genfromtxt(input_path, delimiter=1, dtype=int)
+    levels = np.genfromtxt(input_path, delimiter=1, dtype=np.uint8)
     total_flashes = 0
     steps = 0
     while np.sum(levels) != 0:
         steps += 1
-        # Increase all energy levels with 1
-        levels += 1
-        # Track indices of flashing and flashed octopuses
-        flashing = list(zip(*np.where(levels > 9)))
-        flashed = []
-        while flashing:
-            for row, col in flashing:
-                # Increase energy level of neighboring octopuses
-                row_min, row_max = max(row - 1, 0), min(row + 2, len(levels))
-                col_min, col_max = max(col - 1, 0), min(col + 2, len(levels))
-                levels[row_min:row_max, col_min:col_max] += 1
-
-                # Keep track of flashed octopuses
-                flashed.append((row, col))
-
-                # Remove current flashing octopuses from list of indices
-                flashing.remove((row, col))
-
-            # Get indices of new flashing octopuses
-            flashing = list(set(zip(*np.where(levels > 9))) - set(flashed))
-
-        # Set energy levels to 0 of all octopuses that flashed
-        if flashed:
-            levels[tuple(zip(*flashed))] = 0
-        total_flashes += len(flashed)
+        total_flashes += np.count_nonzero(simulate_step(levels))
 
         if steps == 100 and first_puzzle:
             return total_flashes
@@ -66,6 +148,19 @@ def main():
     second_answer = track_flashes(file_path, first_puzzle=False)
     assert second_answer == 220
 
+    # Stack of test and real input grids
+    levels = np.stack([np.genfromtxt(path, delimiter=1, dtype=np.uint8) for path in [test_file_path, file_path]])
+    total_flashes, _ = simulate_grids(levels.copy(), 100)
+    assert total_flashes.tolist() == [1656, 1652]
+    _, sync_steps = simulate_grids(levels, 250)
+    assert sync_steps.tolist() == [195, 220]
+
+    levels = np.genfromtxt(test_file_path, delimiter=1, dtype=np.uint8)
+    assert count_flashes_long(levels.copy(), 100) == (1656, None)
+    total_flashes, _ = simulate_grids(levels[np.newaxis].copy(), 1000)
+    assert count_flashes_long(levels.copy(), 1000) == (total_flashes[0], 195)
+    assert count_flashes_long(levels, 10 ** 12) == (total_flashes[0] + (10 ** 12 - 1000) * 10, 195)
+
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,13 @@
 # https://adventofcode.com/2021/day/12
 
+import multiprocessing
+import os
+import pickle
+import queue
 from collections import defaultdict
-from typing import Dict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Set
 
 from utils.utils import get_input_path
 
@@ -50,14 +56,157 @@ def find_paths(
     return all_paths
 
 
-def count_paths(input_path: str, first_puzzle: bool) -> int:
-    """Count the total number of possible paths through the cave system.
-    Based on the input a dict is made of all connections in the cave system.
-    This is used with the recursive function to find all possible paths through the cave system.
+def _generate_paths(
+    caves: Dict[str, list], path: List[str], visited: Set[str], first_puzzle: bool, visit_twice: bool
+) -> Iterator[List[str]]:
+    """Recursively generate all possible paths that continue the given path, following the same rules as find_paths.
+    The path and visited set are updated in place and restored when backtracking, so only one path is kept in memory.
+
+    :param caves: Dict with connections from 1 cave to another.
+    :param path: The traversed path through the cave system so far.
+    :param visited: Set of all small caves that have been visited.
+    :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param visit_twice: If it is still allowed to visit a small cave twice (used for 2nd puzzle only)
+    :return: Generator of all possible paths.
+    """
+    cave = path[-1]
+    if cave == "end":
+        yield path.copy()
+        return
+
+    for next_cave in caves.get(cave, []):
+        # Big caves can always be visited and new caves can be visited
+        if next_cave.isupper() or next_cave not in visited:
+            path.append(next_cave)
+            new_small_cave = not next_cave.isupper()
+            if new_small_cave:
+                visited.add(next_cave)
+            yield from _generate_paths(caves, path, visited, first_puzzle, visit_twice)
+            if new_small_cave:
+                visited.remove(next_cave)
+            path.pop()
+        # For the second puzzle, one small cave can be visited twice (but not the start and end cave)
+        elif not first_puzzle and visit_twice and next_cave not in ["start", "end"]:
+            path.append(next_cave)
+            yield from _generate_paths(caves, path, visited, first_puzzle, False)
+            path.pop()
+
+
+def generate_paths(caves: Dict[str, list], first_puzzle: bool, first_hop: Optional[str] = None) -> Iterator[List[str]]:
+    """Lazily generate all possible paths through the cave system, one at a time.
+    Memory use is proportional to the length of a path, instead of the number of paths.
+
+    :param caves: Dict with connections from 1 cave to another.
+    :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param first_hop: Only generate the paths that continue from 'start' to this cave, or None for all paths
+    :return: Generator of all possible paths.
+    """
+    if first_hop is None:
+        yield from _generate_paths(caves, ["start"], {"start"}, first_puzzle, True)
+    else:
+        visited = {"start"} if first_hop.isupper() else {"start", first_hop}
+        yield from _generate_paths(caves, ["start", first_hop], visited, first_puzzle, True)
+
+
+# Seconds to wait for a batch of paths before checking whether the workers are still running
+POLL_INTERVAL = 1.0
+
+# Queue of the worker processes to send batches of paths through, and event to stop sending paths
+_path_queue = None
+_cancelled = None
+
+
+def _init_path_worker(path_queue: multiprocessing.Queue, cancelled: multiprocessing.Event):
+    """Set the queue of the worker process to send batches of paths through.
+
+    :param path_queue: Queue shared with the main process
+    :param cancelled: Event set by the main process when no more paths are needed
+    """
+    global _path_queue, _cancelled
+    _path_queue = path_queue
+    _cancelled = cancelled
+
+
+def _send_paths(caves: Dict[str, list], first_puzzle: bool, first_hop: str, batch_size: int):
+    """Send all possible paths that start with the given first hop through the queue, in batches.
+    A final None is always sent, so the main process knows this first hop is done.
+
+    :param caves: Dict with connections from 1 cave to another.
+    :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param first_hop: The cave visited after 'start' in all paths
+    :param batch_size: Number of paths to send at once
+    """
+    try:
+        batch = []
+        for path in generate_paths(caves, first_puzzle, first_hop):
+            batch.append(path)
+            if len(batch) == batch_size:
+                if _cancelled.is_set():
+                    return
+                _path_queue.put(batch)
+                batch = []
+        if batch:
+            _path_queue.put(batch)
+    finally:
+        _path_queue.put(None)
+
+
+def generate_paths_parallel(
+    caves: Dict[str, list], first_puzzle: bool, processes: Optional[int] = None, batch_size: int = 1000
+) -> Iterator[List[str]]:
+    """Generate all possible paths through the cave system, with the search split by the first hop out of 'start'
+    over a pool of processes. Paths are streamed back in batches through a bounded queue, so that neither the workers
+    nor the main process hold all paths in memory. Paths of different first hops are generated in no particular order.
+    While waiting for paths, the tasks are checked regularly, so a task that fails without sending its final batch,
+    for example because its worker was killed, raises its error instead of blocking forever.
+
+    :param caves: Dict with connections from 1 cave to another.
+    :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param batch_size: Number of paths sent from a worker at once
+    :return: Generator of all possible paths.
+    """
+    caves = dict(caves)
+    first_hops = caves.get("start", [])
+    path_queue = multiprocessing.Queue(maxsize=4 * (processes or os.cpu_count()))
+    cancelled = multiprocessing.Event()
+    with ProcessPoolExecutor(processes, initializer=_init_path_worker, initargs=(path_queue, cancelled)) as pool:
+        futures = [pool.submit(_send_paths, caves, first_puzzle, first_hop, batch_size) for first_hop in first_hops]
+        try:
+            # Merge the batches of all first hops until each of them is done
+            no_done = 0
+            while no_done < len(first_hops):
+                try:
+                    batch = path_queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    # Raise the error of any failed task, which may never send its final None
+                    for future in futures:
+                        if future.done():
+                            future.result()
+                    continue
+                if batch is None:
+                    no_done += 1
+                else:
+                    yield from batch
+            # Raise any error of the workers
+            for future in futures:
+                future.result()
+        finally:
+            # Unblock workers waiting on the full queue, so the pool can shut down when not all paths were consumed
+            cancelled.set()
+            while not all(future.done() for future in futures):
+                try:
+                    path_queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+
+
+def read_caves(input_path: str) -> Dict[str, list]:
+    """Create a dict of all connections in the cave system described by the input data.
+    Connections back to the 'start' cave and out of the 'end' cave are left out, as they can never be used.
 
     :param input_path: File path of input data
-    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
-    :return: Number of possible paths through the cave system.
+    :return: Dict with connections from 1 cave to another.
     """
     caves = defaultdict(list)
     with open(input_path, "r") as f:
@@ -65,12 +214,57 @@ def count_paths(input_path: str, first_puzzle: bool) -> int:
             c1, c2 = line.strip("\n").split("-")
             if c1 != "end" and c2 != "start":
                 caves[c1].append(c2)
-            if c2 != "nd" and c1 != "start":
+            if c2 != "end" and c1 != "start":
                 caves[c2].append(c1)
+    return caves
+
 
-    paths = find_paths(caves, "start", {"start"}, [], [], first_puzzle)
+def count_paths_memoized(caves: Dict[str, list], first_puzzle: bool) -> int:
+    """Count all possible paths through the cave system without creating the paths.
+    Caves are mapped to integer ids and each small cave to a bit, so the small caves visited so far are a bitmask.
+    The number of paths from a cave to the 'end' cave only depends on the current cave, the visited small caves and
+    whether a small cave has been visited twice already, so it is memoized on those.
+
+    :param caves: Dict with connections from 1 cave to another.
+    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
+    :return: Number of possible paths through the cave system.
+    """
+    names = list(dict.fromkeys([*caves, *(cave for next_caves in caves.values() for cave in next_caves)]))
+    ids = {name: i for i, name in enumerate(names)}
+    next_ids = [[ids[next_cave] for next_cave in caves.get(name, [])] for name in names]
+    bits = [0 if name.isupper() else 1 << i for i, name in enumerate(names)]
+    start, end = ids["start"], ids["end"]
+
+    @lru_cache(maxsize=None)
+    def count(cave: int, visited: int, visited_twice: bool) -> int:
+        if cave == end:
+            return 1
+        total = 0
+        for next_cave in next_ids[cave]:
+            # Big caves can always be visited and new caves can be visited
+            if not visited & bits[next_cave]:
+                total += count(next_cave, visited | bits[next_cave], visited_twice)
+            # One small cave can be visited twice (but not the start and end cave)
+            elif not visited_twice and next_cave != start and next_cave != end:
+                total += count(next_cave, visited, True)
+        return total
+
+    # For the first puzzle, no small cave can be visited twice
+    return count(start, bits[start], first_puzzle)
+
+
+def count_paths(input_path: str, first_puzzle: bool) -> int:
+    """Count the total number of possible paths through the cave system.
+    Based on the input a dict is made of all connections in the cave system.
+    This is used to count all possible paths through the cave system with memoization.
+
+    :param input_path: File path of input data
+    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
+    :return: Number of possible paths through the cave system.
+    """
+    caves = read_caves(input_path)
 
-    return len(paths)
+    return count_paths_memoized(caves, first_puzzle)
 
 
 def main():
@@ -81,6 +275,19 @@ def main():
     assert test_first_answer == 226
     test_second_answer = count_paths(test_file_path, first_puzzle=False)
     assert test_second_answer == 3509
+    caves = read_caves(test_file_path)
+    assert len(find_paths(caves, "start", {"start"}, [], [], first_puzzle=True)) == 226
+    assert len(find_paths(caves, "start", {"start"}, [], [], first_puzzle=False)) == 3509
+    paths = sorted(generate_paths(caves, first_puzzle=False))
+    assert len(paths) == 3509
+    assert sorted(generate_paths_parallel(caves, first_puzzle=False, processes=2, batch_size=100)) == paths
+    # Stopping early shuts the workers down, and tasks that fail to start raise instead of blocking
+    assert len(next(generate_paths_parallel(caves, first_puzzle=False, processes=2, batch_size=1))) > 1
+    try:
+        list(generate_paths_parallel({**caves, "end": [lambda: None]}, first_puzzle=False, processes=2))
+        raise AssertionError("The caves can not be sent to the workers")
+    except (AttributeError, pickle.PicklingError, TypeError):
+        pass
 
     # Real input
     file_path = get_input_path("12.txt")
@@ -1,19 +1,22 @@
 # https://adventofcode.com/2021/day/14
 
 
-import re
-from collections import Counter, defaultdict
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
 
 from utils.utils import get_input_path
 
+# Largest number of steps for which pair counts are updated step by step instead of with the transition matrix
+STEPWISE_MAX_STEPS = 10 ** 4
 
-def count_elements(input_path: str, steps: int) -> int:
-    """Count elements of a polymer that is created using the rules, initial polymer and number of steps.
-    Each step new elements are inserted into the polymer based on the given rules.
+
+def read_polymer_rules(input_path: str) -> Tuple[str, Dict[str, str]]:
+    """Read the polymer template and pair insertion rules from the input file.
 
     :param input_path: File path of input data
-    :param steps: The number of polymer insertion steps
-    :return: The difference between count of most common and least common element
+    :return: The polymer template and a mapping of each pair to the inserted element
     """
     with open(input_path, "r") as f:
         lines = f.read().splitlines()
@@ -24,34 +27,228 @@ def count_elements(input_path: str, steps: int) -> int:
         pair, insert = line.split(" -> ")
         rules[pair] = insert
 
-    polymer = lines[0]
-    # Create initial dict with counts for each pair
-    pairs_new = {}
-    for pair in rules:
-        # Use a lookahead assertion to find overlapping pairs
-        pairs_new[pair] = len(re.findall(f"(?=({pair}))", polymer))
-
-    elements = defaultdict(int, dict(Counter(polymer)))
-    # Keep track of elements count an pairs count while going through steps
-    for step in range(steps):
-        # Make copy of dict so all pairs are considered simultaneously
-        pairs = pairs_new.copy()
-        for pair, count in pairs_new.items():
-            # Get inserted element
+    return lines[0], rules
+
+
+class PairInsertion:
+    """Pair insertion rules compiled into a transition matrix of pair counts.
+    Each step, every pair is replaced by the pairs on either side of the inserted element, so the pair counts after a
+    step are the transition matrix times the pair counts before that step. The pair counts after any number of steps
+    are found by repeated squaring of the matrix. Powers of the matrix are cached, so they are reused for all queries.
+    Counts are exact Python ints in object arrays, which have about as many bits as the number of steps.
+    """
+
+    def __init__(self, template: str, rules: Dict[str, str]):
+        """
+        :param template: The initial polymer
+        :param rules: Mapping of each pair to the inserted element
+        """
+        self.template = template
+        # All pairs that can occur, pairs without a rule stay the same
+        pairs = set(rules) | {template[i : i + 2] for i in range(len(template) - 1)}
+        for pair, insert in rules.items():
+            pairs |= {pair[0] + insert, insert + pair[1]}
+        self.pairs = sorted(pairs)
+        index = {pair: i for i, pair in enumerate(self.pairs)}
+
+        self.matrix = np.zeros((len(self.pairs), len(self.pairs)), dtype=object)
+        for pair in self.pairs:
+            if pair in rules:
+                self.matrix[index[pair[0] + rules[pair]], index[pair]] += 1
+                self.matrix[index[rules[pair] + pair[1]], index[pair]] += 1
+            else:
+                self.matrix[index[pair], index[pair]] += 1
+
+        self.initial_counts = np.zeros(len(self.pairs), dtype=object)
+        for i in range(len(template) - 1):
+            self.initial_counts[index[template[i : i + 2]]] += 1
+
+        # Cached powers of the transition matrix, the i-th item is the matrix to the power 2^i
+        self.powers = [self.matrix]
+
+    @classmethod
+    def from_input(cls, input_path: str) -> "PairInsertion":
+        return cls(*read_polymer_rules(input_path))
+
+    def pair_counts(self, steps: int) -> np.array:
+        """Count each pair of the polymer after the given number of steps.
+
+        :param steps: The number of polymer insertion steps
+        :return: Count of each pair, in the order of self.pairs
+        """
+        counts = self.initial_counts
+        for i in range(steps.bit_length()):
+            if i == len(self.powers):
+                self.powers.append(self.powers[-1].dot(self.powers[-1]))
+            if steps >> i & 1:
+                counts = self.powers[i].dot(counts)
+        return counts
+
+    def element_counts(self, steps: int) -> Dict[str, int]:
+        """Count each element of the polymer after the given number of steps.
+        Every element is the first element of exactly one pair, except for the last element of the polymer, which is
+        always the last element of the template.
+
+        :param steps: The number of polymer insertion steps
+        :return: Count of each element in the polymer
+        """
+        elements = defaultdict(int, {self.template[-1]: 1})
+        for pair, count in zip(self.pairs, self.pair_counts(steps)):
+            elements[pair[0]] += count
+        return {element: count for element, count in elements.items() if count}
+
+    def element_spread(self, steps: int) -> int:
+        """Get the difference between the count of the most common and least common element after the given steps.
+
+        :param steps: The number of polymer insertion steps
+        :return: The difference between count of most common and least common element
+        """
+        counts = self.element_counts(steps).values()
+        return max(counts) - min(counts)
+
+
+class PolymerQuery:
+    """Random access to the elements of a polymer after a number of steps, without building the polymer.
+    The polymer is the expansion of each pair of the template, where the last element of each pair is left out as it
+    is the first element of the next pair, followed by the last element of the template. For every pair and depth,
+    the length of its expansion is calculated once. To find an element, the expansion is descended one step at a time
+    into the left or right pair around the inserted element, using those lengths.
+    """
+
+    def __init__(self, template: str, rules: Dict[str, str]):
+        """
+        :param template: The initial polymer
+        :param rules: Mapping of each pair to the inserted element
+        """
+        self.template = template
+        self.rules = rules
+        self.template_pairs = [template[i : i + 2] for i in range(len(template) - 1)]
+        # Lengths of the expansion of each pair (without its last element) for each depth
+        self.lengths = [defaultdict(lambda: 1)]
+
+    @classmethod
+    def from_input(cls, input_path: str) -> "PolymerQuery":
+        return cls(*read_polymer_rules(input_path))
+
+    def _pair_length(self, pair: str, depth: int) -> int:
+        while len(self.lengths) <= depth:
+            lengths = self.lengths[-1]
+            self.lengths.append(
+                defaultdict(
+                    lambda: 1,
+                    {
+                        pair: lengths[pair[0] + insert] + lengths[insert + pair[1]]
+                        for pair, insert in self.rules.items()
+                    },
+                )
+            )
+        return self.lengths[depth][pair]
+
+    def length(self, steps: int) -> int:
+        """Get the length of the polymer after the given number of steps.
+
+        :param steps: The number of polymer insertion steps
+        :return: Number of elements in the polymer
+        """
+        return sum(self._pair_length(pair, steps) for pair in self.template_pairs) + 1
+
+    def element_at(self, steps: int, position: int) -> str:
+        """Get the element at the given position of the polymer after the given number of steps.
+
+        :param steps: The number of polymer insertion steps
+        :param position: Index of the element in the polymer
+        :return: The element at the position
+        """
+        if not 0 <= position < self.length(steps):
+            raise IndexError(f"Position {position} is outside of the polymer after {steps} steps")
+
+        # Find the template pair that expands to the position
+        for pair in self.template_pairs:
+            pair_length = self._pair_length(pair, steps)
+            if position < pair_length:
+                break
+            position -= pair_length
+        else:
+            return self.template[-1]
+
+        # Descend into the left or right pair around the inserted element
+        for depth in range(steps - 1, -1, -1):
+            if pair not in self.rules:
+                break
+            left_pair = pair[0] + self.rules[pair]
+            left_length = self._pair_length(left_pair, depth)
+            if position < left_length:
+                pair = left_pair
+            else:
+                position -= left_length
+                pair = self.rules[pair] + pair[1]
+        return pair[0]
+
+    def elements(self, steps: int, start: int, stop: int) -> Iterator[str]:
+        """Generate the elements in a range of positions of the polymer after the given number of steps.
+
+        :param steps: The number of polymer insertion steps
+        :param start: Index of the first element
+        :param stop: Index after the last element
+        :return: Generator of the elements in the range
+        """
+        for position in range(start, min(stop, self.length(steps))):
+            yield self.element_at(steps, position)
+
+
+def step_element_spread(template: str, rules: Dict[str, str], steps: int) -> int:
+    """Count elements of a polymer by updating the count of each pair once per step.
+    This takes O(steps x rules) time, which is faster than the transition matrix for small numbers of steps.
+
+    :param template: The initial polymer
+    :param rules: Mapping of each pair to the inserted element
+    :param steps: The number of polymer insertion steps
+    :return: The difference between count of most common and least common element
+    """
+    pairs = defaultdict(int)
+    for i in range(len(template) - 1):
+        pairs[template[i : i + 2]] += 1
+    elements = defaultdict(int)
+    for element in template:
+        elements[element] += 1
+
+    for _ in range(steps):
+        new_pairs = defaultdict(int)
+        for pair, count in pairs.items():
+            if pair not in rules:
+                new_pairs[pair] += count
+                continue
             insert = rules[pair]
-            # Remove all original pairs, because they are now split up
-            pairs[pair] -= count
-            # Add as many new pairs as there were original pairs
-            pairs[pair[0] + insert] += count
-            pairs[insert + pair[1]] += count
-            # Count the inserted elements
+            new_pairs[pair[0] + insert] += count
+            new_pairs[insert + pair[1]] += count
             elements[insert] += count
+        pairs = new_pairs
+    return max(elements.values()) - min(elements.values())
 
-        pairs_new = pairs
 
-    # Return difference between count of most common and least common element
-    sorted_elements = sorted(elements.items(), key=lambda x: x[1], reverse=True)
-    return sorted_elements[0][1] - sorted_elements[-1][1]
+def count_elements(input_path: str, steps: int) -> int:
+    """Count elements of a polymer that is created using the rules, initial polymer and number of steps.
+    Each step new elements are inserted into the polymer based on the given rules. Up to STEPWISE_MAX_STEPS steps, the
+    pair counts are updated step by step, for more steps the transition matrix is raised to the number of steps.
+
+    :param input_path: File path of input data
+    :param steps: The number of polymer insertion steps
+    :return: The difference between count of most common and least common element
+    """
+    if steps <= STEPWISE_MAX_STEPS:
+        return step_element_spread(*read_polymer_rules(input_path), steps)
+    return PairInsertion.from_input(input_path).element_spread(steps)
+
+
+def count_elements_batch(input_path: str, steps: List[int]) -> List[int]:
+    """Count elements of a polymer for several numbers of steps at once, reusing the transition matrix powers.
+
+    :param input_path: File path of input data
+    :param steps: The numbers of polymer insertion steps
+    :return: The difference between count of most common and least common element for each number of steps
+    """
+    pair_insertion = PairInsertion.from_input(input_path)
+    return [pair_insertion.element_spread(step) for step in steps]
 
 
 def main():
@@ -62,6 +259,13 @@ def main():
     assert test_first_answer == 1588
     test_second_answer = count_elements(test_file_path, 40)
     assert test_second_answer == 2188189693529
+    assert count_elements_batch(test_file_path, [0, 10, 40]) == [1, 1588, 2188189693529]
+
+    polymer_query = PolymerQuery.from_input(test_file_path)
+    assert "".join(polymer_query.elements(3, 0, 100)) == "NBBBCNCCNBBNBNBBCHBHHBCHB"
+    assert "".join(polymer_query.elements(2, 3, 7)) == "CNBB"
+    assert polymer_query.length(10) == 3073
+    assert polymer_query.element_at(40, polymer_query.length(40) - 1) == "B"
 
     # Real input
     file_path = get_input_path("14.txt")
@@ -70,6 +274,7 @@ def main():
     assert first_answer == 2233
     second_answer = count_elements(file_path, 40)
     assert second_answer == 2884513602164
+    assert count_elements_batch(file_path, [10, 40, 100]) == [2233, 2884513602164, count_elements(file_path, 100)]
 
 
 if __name__ == "__main__":
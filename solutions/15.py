@@ -1,105 +1,555 @@
 # https://adventofcode.com/2021/day/15
 
+import hashlib
 import heapq
+import multiprocessing
+import os
 import sys
+import tempfile
+import time
+from array import array
 from collections import defaultdict
-from typing import Dict, List, Tuple
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 
 from utils.utils import get_input_path
 
+MAX_RISK = 9
 
-def create_risks_matrix(input_path: str, first_puzzle: bool) -> np.array:
+
+class TiledRisks:
+    """Virtual risk map of a tile that is repeated to the right and downward a number of times.
+    Each repeated tile has all risk levels increased by the number of tiles it is away from the top left tile,
+    wrapping back around to 1 above 9. Risk levels are computed on demand from the original tile, so the full map is
+    never created in memory. Like a 2D numpy array, it has a shape and risk levels can be looked up with a flat index
+    using item() or with a (row, col) index.
+    """
+
+    def __init__(self, tile: np.array, factor: int):
+        """
+        :param tile: 2D numpy array with the risk levels of the top left tile
+        :param factor: Number of times the tile is repeated in each direction
+        """
+        self.tile = tile.tolist()
+        self.tile_rows, self.tile_cols = tile.shape
+        self.factor = factor
+        self.shape = (self.tile_rows * factor, self.tile_cols * factor)
+        self.size = self.shape[0] * self.shape[1]
+
+    def __getitem__(self, index: Tuple[int, int]) -> int:
+        row, col = index
+        tile_row, row = divmod(row, self.tile_rows)
+        tile_col, col = divmod(col, self.tile_cols)
+        return (self.tile[row][col] + tile_row + tile_col - 1) % MAX_RISK + 1
+
+    def item(self, node: int) -> int:
+        return self[divmod(node, self.shape[1])]
+
+    def rows(self, start: int, stop: int) -> np.array:
+        """Create a 2D numpy array with the risk levels of a band of rows.
+
+        :param start: First row of the band
+        :param stop: Row after the last row of the band
+        :return: Risk levels of the rows in the band
+        """
+        tile_row, row = np.divmod(np.arange(start, stop), self.tile_rows)
+        tile_col, col = np.divmod(np.arange(self.shape[1]), self.tile_cols)
+        band = np.array(self.tile)[np.ix_(row, col)] + tile_row[:, np.newaxis] + tile_col
+        return (band - 1) % MAX_RISK + 1
+
+
+def create_risks_matrix(input_path: str, first_puzzle: bool, tile_factor: int = 5) -> Union[np.array, TiledRisks]:
     """Create a 2D numpy array representing risk levels based on the input data.
     For the first puzzle, the input data represents the matrix.
     For the second puzzle, the input data is just the top left tile of a 5x5 tiled matrix. The top left tile is
     repeated to the right and downward, but all risk levels are 1 level higher. The maximum risk level is 9,
-    anything above that will wrap back around to 1.
+    anything above that will wrap back around to 1. This tiled matrix is returned as a virtual TiledRisks map.
 
     :param input_path: File path of input data
     :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param tile_factor: Number of times the tile is repeated in each direction (2nd puzzle only)
     :return: Matrix with risk levels
     """
     risks = np.genfromtxt(input_path, delimiter=1, dtype=int)
     if first_puzzle:
         return risks
     else:
-        size = int(risks.size ** 0.5)
-        tiled_risks = np.zeros((size * 5, size * 5), dtype=int)
-        for row_increase, i in enumerate(range(0, size * 5, size)):
-            for col_increase, j in enumerate(range(0, size * 5, size)):
-                tiled_risks[i : i + size, j : j + size] = (risks + row_increase + col_increase) % 9
-        tiled_risks[tiled_risks == 0] = 9
-        return tiled_risks
-
-
-def create_node_graph(risks: np.array, size: int) -> Dict[Tuple[int, int], List[Tuple[Tuple[int, int], int]]]:
-    """Create a graph with each node in the risks array as keys.
-    For each node all neighboring nodes and the distance to those are included as values.
-
-    :param risks: 2D numpy array with risk levels for each node
-    :param size: Number of rows and columns of the array
-    :return: The graph with node information.
+        return TiledRisks(risks, tile_factor)
+
+
+class HeapQueue:
+    """Priority queue of nodes backed by a binary heap.
+    Pushing a node that is already queued adds a second entry, outdated entries have to be skipped after popping.
+    """
+
+    def __init__(self, size: int, max_step: int):
+        """
+        :param size: Number of nodes in the graph (unused, for compatibility with BucketQueue)
+        :param max_step: Maximum priority increase per push (unused, for compatibility with BucketQueue)
+        """
+        self.heap = []
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, node: int, priority: int):
+        heapq.heappush(self.heap, (priority, node))
+
+    def pop(self) -> Tuple[int, int]:
+        return heapq.heappop(self.heap)
+
+
+class BucketQueue:
+    """Circular bucket queue (Dial's algorithm) for small integer priorities.
+    Pushed priorities are never lower than the last popped priority and at most max_step higher, so max_step + 1
+    buckets that are reused in a circular fashion are enough. Each bucket is a doubly linked list of nodes stored in
+    preallocated arrays. Pushing a node that is already queued moves it to its new bucket, so there are no outdated
+    entries.
+    """
+
+    def __init__(self, size: int, max_step: int):
+        """
+        :param size: Number of nodes in the graph
+        :param max_step: Maximum difference between a pushed priority and the last popped priority
+        """
+        self.no_buckets = max_step + 1
+        self.heads = array("q", [-1]) * self.no_buckets
+        self.next = array("q", [-1]) * size
+        self.prev = array("q", [-1]) * size
+        # Bucket of each node, -1 if the node is not queued
+        self.bucket = array("q", [-1]) * size
+        # Last popped priority, None until the first push
+        self.priority = None
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def _unlink(self, node: int):
+        prev_node, next_node = self.prev[node], self.next[node]
+        if prev_node == -1:
+            self.heads[self.bucket[node]] = next_node
+        else:
+            self.next[prev_node] = next_node
+        if next_node != -1:
+            self.prev[next_node] = prev_node
+        self.bucket[node] = -1
+        self.length -= 1
+
+    def push(self, node: int, priority: int):
+        if self.bucket[node] != -1:
+            self._unlink(node)
+        # Priorities start at the first pushed priority, later pushes are never below the last popped priority
+        if self.priority is None:
+            self.priority = priority
+        # Insert node at the front of the bucket
+        bucket = priority % self.no_buckets
+        head = self.heads[bucket]
+        self.next[node] = head
+        self.prev[node] = -1
+        if head != -1:
+            self.prev[head] = node
+        self.heads[bucket] = node
+        self.bucket[node] = bucket
+        self.length += 1
+
+    def pop(self) -> Tuple[int, int]:
+        # Move to the next non-empty bucket
+        while self.heads[self.priority % self.no_buckets] == -1:
+            self.priority += 1
+        node = self.heads[self.priority % self.no_buckets]
+        self._unlink(node)
+        return self.priority, node
+
+
+QUEUES = {"heap": HeapQueue, "bucket": BucketQueue}
+
+
+def calculate_distances(
+    risks: Union[np.array, TiledRisks], target: Optional[int] = None, a_star: bool = False, queue: str = "heap"
+) -> np.array:
+    """Calculate the lowest total risk of a path from the top left position to other positions of the risks array.
+    Nodes are flat integer indices into the array, neighbors are derived from the index on the fly and distances are
+    stored in a preallocated array, so no graph has to be built.
+    Without a target, distances to all positions are calculated. With a target, the search stops as soon as the target
+    is finalised and only the distance to the target is guaranteed to be the lowest.
+    In A* mode the queue is ordered by the distance plus the Manhattan distance to the target. Every risk level is at
+    least 1, so this heuristic never overestimates the remaining risk.
+
+    :param risks: 2D numpy array or TiledRisks map with risk levels for each node
+    :param target: Flat index of the target position, or None to calculate the distances to all positions
+    :param a_star: Whether to use A* with a Manhattan distance heuristic instead of plain Dijkstra (requires target)
+    :param queue: Priority queue to use, either "heap" (binary heap) or "bucket" (Dial's bucket queue)
+    :return: Flat array with the lowest total risk for each position
     """
-    graph = {}
-    for i in range(size):
-        for j in range(size):
-            left = ((i, j - 1), risks[i][j - 1]) if j > 1 else None
-            right = ((i, j + 1), risks[i][j + 1]) if j < size - 1 else None
-            up = ((i - 1, j), risks[i - 1][j]) if i > 1 else None
-            down = ((i + 1, j), risks[i + 1][j]) if i < size - 1 else None
-            graph[(i, j)] = list(filter(None, [left, right, up, down]))
-    return graph
-
-
-def calculate_lowest_risk(input_path: str, first_puzzle: bool) -> int:
+    if a_star and target is None:
+        raise ValueError("A* requires a target position")
+    no_rows, no_cols = risks.shape
+    target_row, target_col = divmod(target, no_cols) if target is not None else (0, 0)
+
+    # Array with shortest distance to node 0 for all nodes
+    dist_to_start = np.full(no_rows * no_cols, np.iinfo(np.int64).max, dtype=np.int64)
+    dist_to_start[0] = 0
+
+    # Queue with nodes by priority, the priority is the distance plus the heuristic in A* mode.
+    # A step adds at most the maximum risk level, plus 1 for a change of the heuristic in A* mode.
+    queue = QUEUES[queue](no_rows * no_cols, MAX_RISK + 1)
+    queue.push(0, target_row + target_col if a_star else 0)
+
+    while queue:
+        priority, node = queue.pop()
+        row, col = divmod(node, no_cols)
+        dist = priority - (abs(target_row - row) + abs(target_col - col)) if a_star else priority
+
+        # Skip outdated queue entries, the node has already been finalised with a shorter distance
+        if dist > dist_to_start.item(node):
+            continue
+        # The optimal path is known as soon as the target node is finalised
+        if node == target:
+            break
+
+        # Go through all neighbors of node (left, right, up, down) and update distance values
+        for neighbor, exists in (
+            (node - 1, col > 0),
+            (node + 1, col < no_cols - 1),
+            (node - no_cols, row > 0),
+            (node + no_cols, row < no_rows - 1),
+        ):
+            if not exists:
+                continue
+            new_dist = dist + risks.item(neighbor)
+
+            # If new distance is shorter, update distance in array and add node to queue
+            if new_dist < dist_to_start.item(neighbor):
+                dist_to_start[neighbor] = new_dist
+                if a_star:
+                    neighbor_row, neighbor_col = divmod(neighbor, no_cols)
+                    new_dist += abs(target_row - neighbor_row) + abs(target_col - neighbor_col)
+                queue.push(neighbor, new_dist)
+
+    return dist_to_start
+
+
+def find_lowest_risk(risks: Union[np.array, TiledRisks], a_star: bool = False, queue: str = "heap") -> int:
+    """Find the lowest total risk of a path from the top left to the bottom right position of the risks array.
+
+    :param risks: 2D numpy array or TiledRisks map with risk levels for each node
+    :param a_star: Whether to use A* with a Manhattan distance heuristic instead of plain Dijkstra
+    :param queue: Priority queue to use, either "heap" (binary heap) or "bucket" (Dial's bucket queue)
+    :return: The total risk level of the optimal path.
+    """
+    target = risks.size - 1
+    return calculate_distances(risks, target, a_star, queue).item(target)
+
+
+class DistanceField:
+    """Lowest total risk from the top left position to every position of a cavern.
+    The distances are calculated once, after which the lowest risk to any position is a lookup and the optimal path to
+    any position is reconstructed by walking back through neighbors whose distance plus the risk level of the next
+    position equals the distance of that position.
+    """
+
+    def __init__(self, risks: Union[np.array, TiledRisks], distances: Optional[np.array] = None):
+        """
+        :param risks: 2D numpy array or TiledRisks map with risk levels for each node
+        :param distances: Previously calculated 2D array of distances, calculated when not given
+        """
+        self.risks = risks
+        if distances is None:
+            distances = calculate_distances(risks).reshape(risks.shape)
+        self.distances = distances
+
+    @classmethod
+    def from_input(
+        cls, input_path: str, first_puzzle: bool, tile_factor: int = 5, cache_dir: Optional[str] = None
+    ) -> "DistanceField":
+        """Create the distance field for the cavern described by input data.
+        If a cache directory is given, the distances are stored in there as a .npy file named after a hash of the
+        input data and size of the cavern, so they are only calculated once.
+
+        :param input_path: File path of input data
+        :param first_puzzle: Whether the cavern of the first puzzle is used.
+        :param tile_factor: Number of times the input tile is repeated in each direction (2nd puzzle only)
+        :param cache_dir: Directory to cache the distances in, or None to not cache the distances
+        :return: The distance field
+        """
+        risks = create_risks_matrix(input_path, first_puzzle, tile_factor)
+        if cache_dir is None:
+            return cls(risks)
+
+        with open(input_path, "rb") as f:
+            input_hash = hashlib.sha256(f.read())
+        input_hash.update(str(risks.shape).encode())
+        cache_path = os.path.join(cache_dir, f"15_{input_hash.hexdigest()}.npy")
+
+        if os.path.exists(cache_path):
+            return cls(risks, np.load(cache_path))
+        distance_field = cls(risks)
+        np.save(cache_path, distance_field.distances)
+        return distance_field
+
+    def lowest_risk(self, row: int, col: int) -> int:
+        """Get the total risk level of the optimal path to the given position.
+
+        :param row: Row of the target position
+        :param col: Column of the target position
+        :return: The total risk level of the optimal path.
+        """
+        return self.distances.item(row, col)
+
+    def path(self, row: int, col: int) -> List[Tuple[int, int]]:
+        """Reconstruct the optimal path from the top left position to the given position.
+
+        :param row: Row of the target position
+        :param col: Column of the target position
+        :return: Positions of the optimal path, starting with the top left position
+        """
+        no_rows, no_cols = self.distances.shape
+        path = [(row, col)]
+        while row or col:
+            dist = self.distances.item(row, col) - self.risks[row, col]
+            for prev_row, prev_col in ((row, col - 1), (row, col + 1), (row - 1, col), (row + 1, col)):
+                if not (0 <= prev_row < no_rows and 0 <= prev_col < no_cols):
+                    continue
+                if self.distances.item(prev_row, prev_col) == dist:
+                    row, col = prev_row, prev_col
+                    break
+            path.append((row, col))
+        return path[::-1]
+
+
+# Shared arrays of the delta-stepping worker processes
+_shared = {}
+
+
+def _init_delta_stepping_worker(risks_name: str, dist_name: str, shape: Tuple[int, int]):
+    """Attach the worker process to the shared memory with the risk levels and distances.
+
+    :param risks_name: Name of the shared memory with risk levels
+    :param dist_name: Name of the shared memory with distances
+    :param shape: Number of rows and columns of the cavern
+    """
+    _shared["shape"] = shape
+    for key, name, dtype in (("risks", risks_name, np.uint8), ("dist", dist_name, np.int64)):
+        memory = shared_memory.SharedMemory(name=name)
+        _shared[key + "_memory"] = memory
+        _shared[key] = np.ndarray(shape[0] * shape[1], dtype=dtype, buffer=memory.buf)
+
+
+def _lower_distances(nodes: np.array, dists: np.array, upper: int) -> Tuple[np.array, np.array]:
+    """Lower the shared distances of the given nodes to the given distances where those are shorter.
+
+    :param nodes: Flat indices of nodes, may contain duplicates
+    :param dists: New distances of the nodes
+    :param upper: Upper bound of the current bucket
+    :return: The improved nodes in the current bucket and the improved nodes above the current bucket
+    """
+    dist = _shared["dist"]
+    improved = np.unique(nodes[dists < dist[nodes]])
+    np.minimum.at(dist, nodes, dists)
+    in_bucket = dist[improved] < upper
+    return improved[in_bucket], improved[~in_bucket]
+
+
+def _relax_band(band: Tuple[int, int, np.array, np.array, np.array, int, int]) -> Tuple[np.array, ...]:
+    """Relax all edges from the nodes of a band of rows in the current bucket, until there are no such nodes left.
+    Distances are only written for nodes in the band. Relaxations of edges into other bands are returned as requests,
+    which are sent to the worker of that band in the next round.
+
+    :param band: First and last + 1 node of the band, nodes of the band that are in the current bucket, requests to
+        relax nodes of the band (nodes and distances), and the lower and upper bound of the current bucket
+    :return: Requests for other bands (nodes and distances) and nodes of the band that were lowered to a later bucket
+        (nodes and distances)
+    """
+    first, last, frontier, request_nodes, request_dists, lower, upper = band
+    risks, dist = _shared["risks"], _shared["dist"]
+    no_rows, no_cols = _shared["shape"]
+
+    # Skip outdated nodes, which have been finalised in an earlier bucket already
+    frontier = np.unique(frontier[(dist[frontier] >= lower) & (dist[frontier] < upper)])
+    frontier_requested, later = _lower_distances(request_nodes, request_dists, upper)
+    frontier = np.union1d(frontier, frontier_requested)
+    later_nodes = [later]
+    out_nodes, out_dists = [frontier[:0]], [frontier[:0]]
+
+    while frontier.size:
+        # Get all neighbors (left, right, up, down) of the frontier nodes and their new distances
+        rows, cols = np.divmod(frontier, no_cols)
+        nodes, dists = [], []
+        for offset, exists in (
+            (-1, cols > 0),
+            (1, cols < no_cols - 1),
+            (-no_cols, rows > 0),
+            (no_cols, rows < no_rows - 1),
+        ):
+            nodes.append(frontier[exists] + offset)
+            dists.append(dist[frontier[exists]])
+        nodes = np.concatenate(nodes)
+        dists = np.concatenate(dists) + risks[nodes]
+
+        # Neighbors in other bands are requested from their worker, if their distance may be improved
+        own = (nodes >= first) & (nodes < last)
+        requested = ~own & (dists < dist[nodes])
+        out_nodes.append(nodes[requested])
+        out_dists.append(dists[requested])
+
+        frontier, later = _lower_distances(nodes[own], dists[own], upper)
+        later_nodes.append(later)
+
+    later_nodes = np.unique(np.concatenate(later_nodes))
+    return np.concatenate(out_nodes), np.concatenate(out_dists), later_nodes, dist[later_nodes]
+
+
+def calculate_distances_parallel(
+    risks: Union[np.array, TiledRisks], processes: Optional[int] = None, delta: int = 3 * MAX_RISK
+) -> np.array:
+    """Calculate the lowest total risk of a path from the top left position to all positions of the risks array using
+    delta-stepping, with bands of rows divided over a pool of processes.
+    Nodes are kept in buckets of distances of width delta. The nodes of the lowest non-empty bucket are relaxed by the
+    worker of their band, in rounds until no band has nodes in the bucket left. Relaxations of edges across band
+    boundaries are sent to the worker of the other band in the next round. After a bucket is done, all distances below
+    its upper bound are final, so the result equals that of Dijkstra.
+    This mode is not expected to scale with the number of processes. Each round of each bucket is a blocking pool.map,
+    which pickles every frontier, request and later bucket array through the main process, and a bucket of width delta
+    takes many short rounds. That exchange grows with the number of bands and dominates the relaxation work itself, so
+    adding processes usually makes it slower rather than faster. Use benchmark_processes to measure it.
+
+    :param risks: 2D numpy array or TiledRisks map with risk levels for each node
+    :param processes: Number of worker processes and bands, defaults to the number of CPUs
+    :param delta: Width of the distance buckets
+    :return: Flat array with the lowest total risk for each position
+    """
+    no_rows, no_cols = risks.shape
+    processes = processes or os.cpu_count()
+    bounds = np.linspace(0, no_rows, processes + 1, dtype=int)
+    bands = [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop]
+    # First node of each band
+    band_nodes = np.array([start * no_cols for start, _ in bands])
+    no_nodes = np.zeros(0, dtype=np.int64)
+
+    risks_memory = shared_memory.SharedMemory(create=True, size=risks.size)
+    dist_memory = shared_memory.SharedMemory(create=True, size=risks.size * 8)
+    try:
+        shared_risks = np.ndarray(risks.shape, dtype=np.uint8, buffer=risks_memory.buf)
+        for start, stop in bands:
+            shared_risks[start:stop] = risks.rows(start, stop) if isinstance(risks, TiledRisks) else risks[start:stop]
+        dist = np.ndarray(risks.size, dtype=np.int64, buffer=dist_memory.buf)
+        dist.fill(np.iinfo(np.int64).max)
+        dist[0] = 0
+
+        # Nodes of each bucket, possibly outdated when a node was lowered to an earlier bucket later on
+        buckets = defaultdict(list, {0: [np.zeros(1, dtype=np.int64)]})
+
+        with multiprocessing.Pool(
+            len(bands), _init_delta_stepping_worker, (risks_memory.name, dist_memory.name, risks.shape)
+        ) as pool:
+            while buckets:
+                bucket = min(buckets)
+                lower, upper = bucket * delta, (bucket + 1) * delta
+                frontier = np.concatenate(buckets.pop(bucket))
+                frontier_bands = np.searchsorted(band_nodes, frontier, side="right") - 1
+                frontiers = [frontier[frontier_bands == i] for i in range(len(bands))]
+                requests = [(no_nodes, no_nodes)] * len(bands)
+
+                # Relax the bucket in rounds until no band has requests for other bands anymore
+                while True:
+                    results = pool.map(
+                        _relax_band,
+                        [
+                            (start * no_cols, stop * no_cols, frontiers[i], *requests[i], lower, upper)
+                            for i, (start, stop) in enumerate(bands)
+                        ],
+                    )
+                    for _, _, later_nodes, later_dists in results:
+                        for later_bucket in np.unique(later_dists // delta):
+                            buckets[later_bucket].append(later_nodes[later_dists // delta == later_bucket])
+
+                    request_nodes = np.concatenate([result[0] for result in results])
+                    if not request_nodes.size:
+                        break
+                    request_dists = np.concatenate([result[1] for result in results])
+                    request_bands = np.searchsorted(band_nodes, request_nodes, side="right") - 1
+                    requests = [
+                        (request_nodes[request_bands == i], request_dists[request_bands == i])
+                        for i in range(len(bands))
+                    ]
+                    frontiers = [no_nodes] * len(bands)
+
+        return dist.copy()
+    finally:
+        for memory in (risks_memory, dist_memory):
+            memory.close()
+            memory.unlink()
+
+
+def calculate_lowest_risk(
+    input_path: str,
+    first_puzzle: bool,
+    a_star: bool = False,
+    tile_factor: int = 5,
+    queue: str = "heap",
+    processes: Optional[int] = None,
+) -> int:
     """Given the square cavern described by input data, find the optimal path from the top left position to the
-    bottom right position. The optimal path has the lowest total risk and is found using Dijkstra's algorithm.
-    Finally, return the total risk level of the optimal path.
+    bottom right position. The optimal path has the lowest total risk and is found using Dijkstra's algorithm, or A*
+    if requested. Finally, return the total risk level of the optimal path.
 
     :param input_path: File path of input data
     :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param a_star: Whether to use A* with a Manhattan distance heuristic instead of plain Dijkstra
+    :param tile_factor: Number of times the input tile is repeated in each direction (2nd puzzle only)
+    :param queue: Priority queue to use, either "heap" (binary heap) or "bucket" (Dial's bucket queue)
+    :param processes: Number of processes to use parallel delta-stepping instead, or None for a single process search.
+        Delta-stepping has no A* mode or queue choice, so a_star and queue must be left at their defaults.
     :return: The total risk level of the optimal path.
     """
-    # Create matrix with risk values for each node
-    risks = create_risks_matrix(input_path, first_puzzle)
-    size = int(risks.size ** 0.5)
+    if processes is not None and (a_star or queue != "heap"):
+        raise ValueError("Parallel delta-stepping does not support a_star or queue")
 
-    # Create graph with neighbors + dist to each node
-    graph = create_node_graph(risks, size)
+    # Create matrix with risk values for each node
+    risks = create_risks_matrix(input_path, first_puzzle, tile_factor)
 
-    # Dictionary with all nodes and shortest distance to node 0,0
-    dist_to_start = defaultdict(lambda: sys.maxsize)
-    dist_to_start[(0, 0)] = 0
+    if processes is not None:
+        return calculate_distances_parallel(risks, processes).item(risks.size - 1)
+    return find_lowest_risk(risks, a_star, queue)
 
-    # Create queue which includes neighboring nodes sorted by distance to node 0,0
-    queue = []
-    heapq.heappush(queue, (0, (0, 0)))
 
-    # Set to keep track of which nodes have been finalised
-    visited = set()
+def benchmark_queues(input_path: str, tile_factors: Tuple[int, ...] = (1, 5, 25)):
+    """Compare the run time of the heap and bucket queues for the cavern tiled by each of the given factors.
 
-    while queue:
-        # Get current node and distance
-        dist, node = heapq.heappop(queue)
-        if node in visited:
-            continue
+    :param input_path: File path of input data
+    :param tile_factors: Numbers of times the input tile is repeated in each direction
+    """
+    tile = np.genfromtxt(input_path, delimiter=1, dtype=int)
+    for tile_factor in tile_factors:
+        risks = TiledRisks(tile, tile_factor)
+        for queue in QUEUES:
+            start = time.perf_counter()
+            lowest_risk = find_lowest_risk(risks, queue=queue)
+            seconds = time.perf_counter() - start
+            print(f"{tile_factor}x tiled, {queue} queue: lowest risk {lowest_risk} in {seconds:.2f}s")
 
-        # Go through all neighbors of node and update distance values
-        neighbors = graph[node]
-        for neighbor in neighbors:
-            neighbor_node, neighbor_dist = neighbor
-            new_dist = neighbor_dist + dist
-            old_dist = dist_to_start[neighbor_node]
 
-            # If new distance is shorter, update distance in dict and add node to queue
-            if new_dist < old_dist:
-                dist_to_start[neighbor_node] = new_dist
-                # Adds item to queue and maintains sorted queue
-                heapq.heappush(queue, (new_dist, neighbor_node))
+def benchmark_processes(input_path: str, processes: Tuple[int, ...] = (1, 2, 4, 8), tile_factor: int = 5):
+    """Compare the run time of parallel delta-stepping for each of the given numbers of processes, against the
+    single process search with the heap queue.
 
-    return dist_to_start[(size - 1, size - 1)]
+    :param input_path: File path of input data
+    :param processes: Numbers of worker processes to use
+    :param tile_factor: Number of times the input tile is repeated in each direction
+    """
+    risks = TiledRisks(np.genfromtxt(input_path, delimiter=1, dtype=int), tile_factor)
+    start = time.perf_counter()
+    lowest_risk = find_lowest_risk(risks)
+    seconds = time.perf_counter() - start
+    print(f"{tile_factor}x tiled, single process: lowest risk {lowest_risk} in {seconds:.2f}s")
+    for no_processes in processes:
+        start = time.perf_counter()
+        lowest_risk = calculate_distances_parallel(risks, no_processes).item(risks.size - 1)
+        seconds = time.perf_counter() - start
+        print(f"{tile_factor}x tiled, {no_processes} processes: lowest risk {lowest_risk} in {seconds:.2f}s")
 
 
 def main():
@@ -108,6 +558,13 @@ def main():
 
     test_first_answer = calculate_lowest_risk(test_file_path, True)
     assert test_first_answer == 16
+    assert calculate_lowest_risk(test_file_path, True, a_star=True) == 16
+    assert calculate_lowest_risk(test_file_path, True, queue="bucket") == 16
+
+    # The bucket queue keeps its cursor when it runs empty, so a cheaper neighbor pushed later is popped first
+    risks = np.array([[3, 8], [3, 4]])
+    assert np.array_equal(calculate_distances(risks, queue="bucket"), [0, 8, 3, 7])
+    assert calculate_distances(risks, 1, a_star=True, queue="bucket").item(1) == 8
 
     # Test input
     test_file_path = get_input_path("15.txt", test=True)
@@ -116,6 +573,26 @@ def main():
     assert test_first_answer == 40
     test_second_answer = calculate_lowest_risk(test_file_path, False)
     assert test_second_answer == 315
+    assert calculate_lowest_risk(test_file_path, False, a_star=True) == 315
+    assert calculate_lowest_risk(test_file_path, False, tile_factor=1) == 40
+    assert calculate_lowest_risk(test_file_path, False, a_star=True, queue="bucket") == 315
+
+    distance_field = DistanceField.from_input(test_file_path, True)
+    assert distance_field.lowest_risk(9, 9) == 40
+    assert distance_field.lowest_risk(0, 1) == 1
+    path = distance_field.path(9, 9)
+    assert path[0] == (0, 0) and path[-1] == (9, 9)
+    assert sum(distance_field.risks[position] for position in path[1:]) == 40
+
+    assert calculate_lowest_risk(test_file_path, False, processes=3) == 315
+    try:
+        calculate_lowest_risk(test_file_path, False, a_star=True, processes=3)
+        raise AssertionError("a_star is not supported with processes")
+    except ValueError:
+        pass
+    tiled_risks = create_risks_matrix(test_file_path, False)
+    assert np.array_equal(calculate_distances_parallel(tiled_risks, 4), calculate_distances(tiled_risks))
+    assert np.array_equal(calculate_distances_parallel(tiled_risks, 2, delta=20), calculate_distances(tiled_risks))
 
     # Real input
     file_path = get_input_path("15.txt")
@@ -124,7 +601,22 @@ def main():
     assert first_answer == 687
     second_answer = calculate_lowest_risk(file_path, False)
     assert second_answer == 2957
+    assert calculate_lowest_risk(file_path, False, a_star=True) == 2957
+    assert calculate_lowest_risk(file_path, False, queue="bucket") == 2957
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        distance_field = DistanceField.from_input(file_path, False, cache_dir=cache_dir)
+        cached_distance_field = DistanceField.from_input(file_path, False, cache_dir=cache_dir)
+    assert np.array_equal(distance_field.distances, cached_distance_field.distances)
+    assert cached_distance_field.lowest_risk(499, 499) == 2957
+    assert cached_distance_field.lowest_risk(99, 99) == 687
+    assert calculate_lowest_risk(file_path, False, processes=4) == 2957
 
 
 if __name__ == "__main__":
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark_queues(get_input_path("15.txt"))
+    elif "--benchmark-processes" in sys.argv:
+        benchmark_processes(get_input_path("15.txt"))
+    else:
+        main()
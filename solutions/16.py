@@ -1,73 +1,277 @@
 # https://adventofcode.com/2021/day/16
 
 
+import math
+import multiprocessing
+import time
+from typing import Generator, List, NamedTuple, Optional, Tuple, Union
+
 from utils.utils import get_input_path
 
 
-def parse_packet(binary_str: str) -> [int, int, int]:
-    """Given the binary_str, recursively go through all the (sub)packets represented by the binary str.
-    Packets with a type id of '100' are literal values, while other packets are operator packets that contain a given
-    number of sub-packets.
+LITERAL_TYPE_ID = 4
+
+# Functions to calculate the value of operator packets from the values of their sub-packets, by type id
+OPERATORS = {
+    0: sum,
+    1: math.prod,
+    2: min,
+    3: max,
+    5: lambda values: int(values[0] > values[1]),
+    6: lambda values: int(values[0] < values[1]),
+    7: lambda values: int(values[0] == values[1]),
+}
+
+
+class Packet(NamedTuple):
+    """A decoded packet with its value and the sum of its version and the versions of all its sub-packets."""
+
+    version: int
+    type_id: int
+    value: int
+    version_sum: int
+    sub_packets: Tuple["Packet", ...] = ()
 
-    :param binary_str: Binary representation of the original hexadecimal transmission.
-    :return: The summed versions, value of the packets and no of bits in the packet
+
+def read_bits(data: Union[bytes, bytearray, memoryview], position: int, no_bits: int) -> int:
+    """Read a number of bits from the data, starting at the given bit position.
+
+    :param data: Bytes to read from
+    :param position: Position of the first bit
+    :param no_bits: Number of bits to read
+    :return: Integer value of the bits
     """
-    version = int(binary_str[0:3], 2)
-    type_id = binary_str[3:6]
-    # Packet represents literal value
-    if type_id == "100":
-        last_group = False
-        i = 0
-        value = ""
-        while not last_group:
-            last_group = binary_str[6 + i] == "0"
-            value += binary_str[7 + i: 11 + i]
-            i += 5
-        bits = 6 + i
-        return version, int(value, 2), bits
-    # Packet is an operator with sub-packets
-    else:
-        total_value = None
-        version_sum = version
-        bits_subpackets = 0
-        no_subpackets = 0
-
-        # Get the length type and how many sub-packets there are (given in bits or no. packets)
-        len_type_id = binary_str[6]
-        len_type_id_bits = 15 if len_type_id == "0" else 11
-        total_bits_no_subpackets = int(binary_str[7: 7 + len_type_id_bits], 2)
-
-        # Get all sub-packets
-        bits_no_subpackets = 0
-        while bits_no_subpackets < total_bits_no_subpackets:
-            version, value, bits = parse_packet(binary_str[7 + len_type_id_bits + bits_subpackets:])
-
-            bits_subpackets += bits
-            no_subpackets += 1
-            bits_no_subpackets = bits_subpackets if len_type_id == "0" else no_subpackets
-
-            version_sum += version
-
-            if total_value is None:
-                total_value = value
+    end = position + no_bits
+    if end > len(data) * 8:
+        raise ValueError("Transmission ended in the middle of a packet")
+    # Get the bytes that include the bits, and shift and mask out the other bits
+    chunk = int.from_bytes(data[position >> 3 : (end + 7) >> 3], "big")
+    return chunk >> (-end % 8) & ((1 << no_bits) - 1)
+
+
+class BitReader:
+    """Read bits from a transmission in bytes, keeping track of the position with an integer cursor."""
+
+    def __init__(self, data: Union[bytes, memoryview]):
+        """
+        :param data: Bytes of the transmission
+        """
+        self.data = memoryview(data)
+        self.position = 0
+
+    def read(self, no_bits: int) -> int:
+        """Read the given number of bits and move the cursor past them.
+
+        :param no_bits: Number of bits to read
+        :return: Integer value of the bits
+        """
+        bits = read_bits(self.data, self.position, no_bits)
+        self.position += no_bits
+        return bits
+
+
+def decode_packet(data: Union[bytes, memoryview], keep_sub_packets: bool = True) -> Packet:
+    """Decode the outermost packet of a transmission, including all its sub-packets.
+    Packets with a type id of 4 are literal values, while other packets are operator packets that contain a given
+    number of sub-packets or sub-packets of a given number of bits. Operator packets that are still missing sub-packets
+    are kept on a stack, so nesting is not limited by the recursion limit.
+
+    :param data: Bytes of the transmission
+    :param keep_sub_packets: Whether to keep the sub-packets in the tree, or only the values and version sums
+    :return: The outermost packet
+    """
+    reader = BitReader(data)
+    # Operator packets with their sub-packets so far, and their end position or number of sub-packets
+    stack = []
+    while True:
+        version, type_id = reader.read(3), reader.read(3)
+        if type_id == LITERAL_TYPE_ID:
+            # Literal value in groups of 4 bits, each prefixed by a bit that is 0 for the last group
+            value = 0
+            last_group = False
+            while not last_group:
+                last_group = reader.read(1) == 0
+                value = value << 4 | reader.read(4)
+            packet = Packet(version, type_id, value, version)
+        else:
+            # The length is given in bits (length type 0) or number of sub-packets (length type 1)
+            if reader.read(1) == 0:
+                length = reader.read(15)
+                stack.append((version, type_id, reader.position + length, None, []))
+            else:
+                stack.append((version, type_id, None, reader.read(11), []))
+            packet = None
+
+        # Add the packet to its operator packet and finish all operator packets that have all their sub-packets
+        while stack:
+            version, type_id, end, no_sub_packets, sub_packets = stack[-1]
+            if packet is not None:
+                sub_packets.append(packet)
+            if reader.position != end and len(sub_packets) != no_sub_packets:
+                break
+            stack.pop()
+            packet = Packet(
+                version,
+                type_id,
+                OPERATORS[type_id]([sub_packet.value for sub_packet in sub_packets]),
+                version + sum(sub_packet.version_sum for sub_packet in sub_packets),
+                tuple(sub_packets) if keep_sub_packets else (),
+            )
+
+        if not stack:
+            return packet
+
+
+class _OperatorState:
+    """State of an operator packet in the stream parser that is still missing sub-packets."""
+
+    __slots__ = ("version", "type_id", "end", "no_sub_packets", "sub_packet_count", "values", "version_sum")
+
+    def __init__(self, version: int, type_id: int, end: Optional[int], no_sub_packets: Optional[int]):
+        self.version = version
+        self.type_id = type_id
+        self.end = end
+        self.no_sub_packets = no_sub_packets
+        self.sub_packet_count = 0
+        # Values of the sub-packets, folded into 1 value for the operators that accept any number of sub-packets
+        self.values = []
+        self.version_sum = version
+
+    def add(self, packet: Packet):
+        self.sub_packet_count += 1
+        self.version_sum += packet.version_sum
+        self.values.append(packet.value)
+        if self.type_id <= 3 and len(self.values) == 2:
+            self.values = [OPERATORS[self.type_id](self.values)]
+
+
+class PacketStreamParser:
+    """Incremental parser of a hexadecimal transmission that is fed in chunks, for example from a file or pipe.
+    Only the bytes that have not been read yet and the operator packets that are missing sub-packets are kept, so
+    memory is bounded by the chunk size and nesting depth instead of the transmission size. Completed packets are
+    returned without their sub-packets, with their value and version sum.
+    """
+
+    def __init__(self, max_depth: Optional[int] = 0):
+        """
+        :param max_depth: Maximum nesting depth of completed packets to return, 0 for only the outermost packet or None
+            for all packets
+        """
+        self.max_depth = max_depth
+        self.buffer = bytearray()
+        # Bit position of the cursor in the buffer, and in the whole transmission
+        self.cursor = 0
+        self.position = 0
+        # Last hexadecimal of an odd number of hexadecimals, which is half a byte
+        self.half_byte = ""
+        self.completed = []
+        self.finished = False
+        # The parser is a generator that receives the number of bits it requests
+        self._parser = self._parse()
+        self._no_bits = next(self._parser)
+
+    def feed(self, hexadecimals: str) -> List[Packet]:
+        """Parse the next chunk of the transmission.
+
+        :param hexadecimals: Hexadecimal string with the next transmission bits
+        :return: The packets that were completed in this chunk
+        """
+        hexadecimals = self.half_byte + hexadecimals.strip()
+        split = len(hexadecimals) - len(hexadecimals) % 2
+        self.half_byte = hexadecimals[split:]
+
+        # Remove the bytes that have been read already
+        del self.buffer[: self.cursor >> 3]
+        self.cursor &= 7
+        self.buffer += bytes.fromhex(hexadecimals[:split])
+
+        while not self.finished and self.cursor + self._no_bits <= len(self.buffer) * 8:
+            bits = read_bits(self.buffer, self.cursor, self._no_bits)
+            self.cursor += self._no_bits
+            self.position += self._no_bits
+            try:
+                self._no_bits = self._parser.send(bits)
+            except StopIteration:
+                self.finished = True
+
+        completed, self.completed = self.completed, []
+        return completed
+
+    def close(self) -> List[Packet]:
+        """Finish parsing the transmission, after all chunks have been fed.
+
+        :return: The packets that were completed by the last half byte
+        """
+        # Pad the last hexadecimal to a full byte, the extra bits are ignored
+        completed = self.feed("0") if self.half_byte else []
+        if not self.finished:
+            raise ValueError("Transmission ended in the middle of a packet")
+        return completed
+
+    def _complete(self, packet: Packet, depth: int):
+        if self.max_depth is None or depth <= self.max_depth:
+            self.completed.append(packet)
+
+    def _parse(self) -> Generator[int, int, None]:
+        """Parse the outermost packet, yielding the number of bits that are needed next and receiving those bits.
+        After the outermost packet the parser stops, the rest of the transmission is padding.
+        """
+        stack = []
+        while True:
+            version = yield 3
+            type_id = yield 3
+            if type_id == LITERAL_TYPE_ID:
+                # Literal value in groups of 4 bits, each prefixed by a bit that is 0 for the last group
+                value = 0
+                last_group = False
+                while not last_group:
+                    last_group = (yield 1) == 0
+                    value = value << 4 | (yield 4)
+                packet = Packet(version, type_id, value, version)
             else:
-                if type_id == "000":
-                    total_value += value
-                elif type_id == "001":
-                    total_value *= value
-                elif type_id == "010":
-                    total_value = min(total_value, value)
-                elif type_id == "011":
-                    total_value = max(total_value, value)
-                elif type_id == "101":
-                    total_value = int(total_value > value)
-                elif type_id == "110":
-                    total_value = int(total_value < value)
-                elif type_id == "111":
-                    total_value = int(total_value == value)
-
-        bits = bits_subpackets + len_type_id_bits + 7
-        return version_sum, total_value, bits
+                # The length is given in bits (length type 0) or number of sub-packets (length type 1)
+                if (yield 1) == 0:
+                    length = yield 15
+                    stack.append(_OperatorState(version, type_id, self.position + length, None))
+                else:
+                    stack.append(_OperatorState(version, type_id, None, (yield 11)))
+                packet = None
+
+            # Add the packet to its operator packet and finish all operator packets that have all their sub-packets
+            while stack:
+                operator = stack[-1]
+                if packet is not None:
+                    self._complete(packet, len(stack))
+                    operator.add(packet)
+                if self.position != operator.end and operator.sub_packet_count != operator.no_sub_packets:
+                    break
+                stack.pop()
+                value = OPERATORS[operator.type_id](operator.values)
+                packet = Packet(operator.version, operator.type_id, value, operator.version_sum)
+
+            if not stack:
+                self._complete(packet, 0)
+                return
+
+
+def stream_hexadecimal_transmission(input_path: str, first_puzzle: bool, chunk_size: int = 1 << 16) -> int:
+    """Decode the hexadecimal transmission in the input file, reading and parsing it in chunks.
+
+    :param input_path: File path of input data
+    :param first_puzzle: Whether the answer for the first puzzle is calculated.
+    :param chunk_size: Number of hexadecimals to read at once
+    :return: The sum of all (sub)packet versions (1st puzzle) or value of outermost packet (2nd puzzle)
+    """
+    parser = PacketStreamParser()
+    packets = []
+    with open(input_path, "r") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            packets += parser.feed(chunk)
+            if parser.finished:
+                break
+    packets += parser.close()
+
+    return packets[0].version_sum if first_puzzle else packets[0].value
 
 
 def read_hexadecimal_input(input_path: str) -> str:
@@ -90,15 +294,58 @@ def decode_hexadecimal_transmission(hexadecimals: str, first_puzzle: bool) -> in
     :return: The sum of all (sub)packet versions (1st puzzle) or value of outermost packet (2nd puzzle)
     """
 
-    binary_str = bin(int(hexadecimals, 16))[2:]
-    starting_zeros = len(hexadecimals) - len(hexadecimals.lstrip("0"))
-    binary_str = "0000" * starting_zeros + binary_str
-    if len(binary_str) % 4 != 0:
-        binary_str = "0" * (4 - len(binary_str) % 4) + binary_str
+    # Pad the last hexadecimal to a full byte, the extra bits are ignored
+    data = bytes.fromhex(hexadecimals + "0" * (len(hexadecimals) % 2))
+    packet = decode_packet(data, keep_sub_packets=False)
+
+    return packet.version_sum if first_puzzle else packet.value
+
 
-    version, value, _ = parse_packet(binary_str)
+class BatchResult(NamedTuple):
+    """Version sums and values of a batch of transmissions, with the decoding throughput."""
 
-    return version if first_puzzle else value
+    version_sums: List[int]
+    values: List[int]
+    transmissions_per_second: float
+    megabytes_per_second: float
+
+
+def _decode_version_sum_and_value(hexadecimals: str) -> Tuple[int, int]:
+    """Decode a transmission in a worker process.
+
+    :param hexadecimals: Hexadecimal string with transmission bits
+    :return: The sum of all (sub)packet versions and value of outermost packet
+    """
+    data = bytes.fromhex(hexadecimals + "0" * (len(hexadecimals) % 2))
+    packet = decode_packet(data, keep_sub_packets=False)
+    return packet.version_sum, packet.value
+
+
+def decode_transmissions_batch(input_path: str, processes: Optional[int] = None, chunksize: int = 256) -> BatchResult:
+    """Decode a file with one hexadecimal transmission per line, spread over a pool of processes.
+    Lines are sent to the workers in chunks, and the results are returned in the order of the input lines.
+
+    :param input_path: File path of input data
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param chunksize: Number of transmissions sent to a worker at once
+    :return: The version sums and values of all transmissions, and the throughput
+    """
+    with open(input_path, "r") as f:
+        transmissions = [line.strip() for line in f if line.strip()]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_decode_version_sum_and_value, transmissions, chunksize)
+    seconds = time.perf_counter() - start
+
+    # Each hexadecimal is half a byte
+    megabytes = sum(len(transmission) for transmission in transmissions) / 2 / 1e6
+    return BatchResult(
+        [version_sum for version_sum, _ in results],
+        [value for _, value in results],
+        len(transmissions) / seconds,
+        megabytes / seconds,
+    )
 
 
 def main():
@@ -117,6 +364,25 @@ def main():
     assert decode_hexadecimal_transmission("9C005AC2F8F0", False) == 0  # If 5 == 15
     assert decode_hexadecimal_transmission("9C0141080250320F1802104A08", False) == 1
 
+    packet = decode_packet(bytes.fromhex("38006F45291200"))
+    assert packet.version == 1 and packet.type_id == 6 and packet.value == 1
+    assert [sub_packet.value for sub_packet in packet.sub_packets] == [10, 20]
+    packet = decode_packet(bytes.fromhex("EE00D40C823060"))
+    assert [sub_packet.value for sub_packet in packet.sub_packets] == [1, 2, 3]
+    assert decode_hexadecimal_transmission("D2FE28", False) == 2021
+
+    parser = PacketStreamParser(max_depth=None)
+    packets = []
+    for hexadecimal in "9C0141080250320F1802104A08":
+        packets += parser.feed(hexadecimal)
+    packets += parser.close()
+    assert [packet.value for packet in packets] == [1, 3, 4, 2, 2, 4, 1]
+    assert packets[-1].version_sum == 20
+
+    batch_result = decode_transmissions_batch(get_input_path("16.txt", test=True), processes=2, chunksize=5)
+    assert batch_result.version_sums[:4] == [16, 12, 23, 31]
+    assert batch_result.values[4:] == [3, 54, 7, 9, 1, 0, 0, 1]
+
     # Real input
     file_path = get_input_path("16.txt")
     hexadecimals = read_hexadecimal_input(file_path)
@@ -125,6 +391,8 @@ def main():
     assert first_answer == 927
     second_answer = decode_hexadecimal_transmission(hexadecimals, False)
     assert second_answer == 1725277876501
+    assert stream_hexadecimal_transmission(file_path, True, chunk_size=7) == 927
+    assert stream_hexadecimal_transmission(file_path, False) == 1725277876501
 
 
 if __name__ == "__main__":
@@ -1,8 +1,42 @@
 # https://adventofcode.com/2021/day/3
-from utils.utils import get_input_path
+from utils.utils import get_input_path, read_digit_grid
 import numpy as np
-import operator
-from typing import Callable
+import os
+import tempfile
+from typing import Tuple
+
+
+def read_diagnostics(file_path: str) -> Tuple[np.array, int]:
+    """ Read the diagnostic report at once, packing the bits of each row into bytes, so any number of bits is supported
+
+    :param file_path: File path of input data
+    :return: Array with the packed bits of each row, most significant bit first, and the number of bits per row
+    """
+    bits = read_digit_grid(file_path)
+    return np.packbits(bits, axis=1), bits.shape[1]
+
+
+def to_int(packed: np.array, no_bits: int) -> int:
+    """ Convert packed bits to an integer
+
+    :param packed: Packed bits, most significant bit first
+    :param no_bits: Number of bits, the remaining bits of the last byte are padding
+    :return: The integer value of the bits
+    """
+    return int.from_bytes(packed.tobytes(), "big") >> (8 * len(packed) - no_bits)
+
+
+def count_ones(packed: np.array, no_bits: int) -> np.array:
+    """ Count the number of 1's in each column, by shifting and masking each bit out of the packed bytes
+
+    :param packed: Array with the packed bits of each row
+    :param no_bits: Number of bits per row
+    :return: Number of 1's in each column
+    """
+    counts = np.zeros(8 * packed.shape[1], dtype=np.int64)
+    for bit in range(8):
+        counts[bit::8] = ((packed >> (7 - bit)) & 1).sum(axis=0)
+    return counts[:no_bits]
 
 
 def power_consumption(file_path: str) -> int:
@@ -11,31 +45,39 @@ def power_consumption(file_path: str) -> int:
     :param file_path: File path of input data
     :return: The calculated power consumption
     """
-    data = np.genfromtxt(file_path, delimiter=1, dtype=int)
-    gamma_binary = 0b00
-    no_bits = data.shape[1]
-    data_size = data.shape[0]
-    for i, col in enumerate(data.sum(axis=0)):
-        binary = f"0b{'0'*i}{int(col>(data_size/2))}{'0'*(no_bits-1-i)}"
-        gamma_binary += eval(binary)
-    epsilon_binary = ~gamma_binary & eval(f"0b{'1'*no_bits}")
+    packed, no_bits = read_diagnostics(file_path)
+    most_common = count_ones(packed, no_bits) > len(packed) / 2
+    gamma = to_int(np.packbits(most_common), no_bits)
+    epsilon = ~gamma & ((1 << no_bits) - 1)
 
-    return gamma_binary * epsilon_binary
+    return gamma * epsilon
 
 
-def filter_data(file_path: str, operator_func: Callable) -> int:
-    """ Loops through columns of data array and filters row based on whether there are mostly 1's or 0's in that row
+def filter_rating(packed: np.array, no_bits: int, most_common: bool) -> int:
+    """ Filter rows bit by bit on whether they have the most or least common bit of the remaining rows.
+    The rows must be sorted, so the remaining rows always share a prefix and are a range of rows, in which rows with a 0
+    come before rows with a 1. Each step splits the range, which takes O(n x bits) time in total.
 
-    :param file_path: Path to file input
-    :param operator_func: Operator function, used to confirm whether two parts are equal or not equal
-    :return: Remaining binary
+    :param packed: Sorted array with the packed bits of each row
+    :param no_bits: Number of bits per row
+    :param most_common: Whether to keep rows with the most common bit, or the least common bit
+    :return: The remaining row
     """
-    data = np.genfromtxt(file_path, delimiter=1, dtype=int)
-    for i in range(np.shape(data)[1]):
-        data = data[np.where(operator_func(data[:, i], int(data.sum(axis=0)[i] >= len(data) / 2)))]
-        if len(data) == 1:
+    start, stop = 0, len(packed)
+    for i in range(no_bits):
+        if stop - start == 1:
             break
-    return int(str(data[0]).strip("[]").replace(" ", ""), 2)
+        column = (packed[start:stop, i // 8] >> (7 - i % 8)) & 1
+        split = start + int(np.searchsorted(column, 1))
+        no_zeros, no_ones = split - start, stop - split
+        if not no_zeros or not no_ones:
+            # All remaining rows have the same bit
+            continue
+        if (no_ones >= no_zeros) == most_common:
+            start = split
+        else:
+            stop = split
+    return to_int(packed[start], no_bits)
 
 
 def life_support_rating(file_path: str) -> int:
@@ -44,9 +86,12 @@ def life_support_rating(file_path: str) -> int:
     :param file_path: File path of input data
     :return: The life support rating
     """
-    oxygen_generator_rating = filter_data(file_path, operator.eq)
+    packed, no_bits = read_diagnostics(file_path)
+    # Sorting on the bytes from first to last sorts the rows on their bits
+    packed = packed[np.lexsort(packed.T[::-1])]
+    oxygen_generator_rating = filter_rating(packed, no_bits, most_common=True)
 
-    co2_scrubber_rating = filter_data(file_path, operator.ne)
+    co2_scrubber_rating = filter_rating(packed, no_bits, most_common=False)
 
     return oxygen_generator_rating * co2_scrubber_rating
 
@@ -60,6 +105,14 @@ def main():
     test_second_answer = life_support_rating(test_file_path)
     assert test_second_answer == 230
 
+    # Windows line endings and trailing spaces are ignored
+    with tempfile.TemporaryDirectory() as temp_dir:
+        crlf_file_path = os.path.join(temp_dir, "3.txt")
+        with open(test_file_path, "r") as f, open(crlf_file_path, "w", newline="\r\n") as crlf_file:
+            crlf_file.write(" \n".join(f.read().split()))
+        assert power_consumption(crlf_file_path) == 198
+        assert life_support_rating(crlf_file_path) == 230
+
     # Real input
     file_path = get_input_path("3.txt")
 
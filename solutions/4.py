@@ -1,81 +1,177 @@
 # https://adventofcode.com/2021/day/4
 from utils.utils import get_input_path
-from typing import List
-from collections import defaultdict
-from textwrap import wrap
+import numpy as np
+import os
+import tempfile
+from typing import Iterable, Iterator, List, Tuple
 
+# Size of the rows and columns of a board
+BOARD_SIZE = 5
 
-def get_boards_info(lines: list) -> List[dict]:
-    """ From input lines create a list of boards.
-    Each board is a dict storing count information (for each row and column) and a mapping of the row and column for
-    each number in the board.
 
-    :param lines: Lines with board numbers
-    :return: List with boards info
-    """
-    boards = []
-    board = {"counts": [defaultdict(int), defaultdict(int)], "map": {}}
-    for row, line in enumerate(lines[2:]):
-        row = row % 6
-        if row == 5:
-            boards.append(board)
-            board = {"counts": [defaultdict(int), defaultdict(int)], "map": {}}
-        board["map"].update({number: (row, col) for col, number in enumerate(wrap(line, 2))})
+def get_boards_info(lines: List[str]) -> np.array:
+    """ From input lines create an array of boards.
 
-    boards.append(board)
-    return boards
+    :param lines: Lines with the drawn numbers, followed by the lines with board numbers
+    :return: Array with the numbers of each board, with shape (number of boards, 5, 5)
+    """
+    return np.array(" ".join(lines[1:]).split(), dtype=np.int64).reshape(-1, BOARD_SIZE, BOARD_SIZE)
 
 
-def get_bingo_scores(file_path: str, first_puzzle: bool) -> [int, int]:
-    """ Given the numbers that are drawn and boards info, find the first and last board to get bingo.
-    Bingo is found by using the map to look up the row and column for each number, when a row or column has a count
-    of 5 that board has bingo.
-    Numbers that are drawn are removed from each board.
-    Boards are removed from the list if they obtain bingo.
+def index_boards(boards: np.array) -> Tuple[np.array, np.array, np.array]:
+    """ Create an inverted index from each number to the positions on the boards where it occurs.
+    Positions are indices in the flattened boards, from which the board, row and column follow.
 
-    :param file_path: File path of input data
-    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
-    :return: Sum of remaining numbers of the winner (1st puzzle) or loser (2nd puzzle) board.
+    :param boards: Array with the numbers of each board
+    :return: Sorted unique numbers, start of the positions of each number (and the end of the last), and the positions
+        sorted by number
+    """
+    numbers = boards.ravel()
+    # Stable sorting of small integer types is a radix sort, which takes linear time
+    keys = numbers - numbers.min(initial=0)
+    positions = np.argsort(keys.astype(np.min_scalar_type(keys.max(initial=0))), kind="stable")
+    numbers, starts = np.unique(numbers[positions], return_index=True)
+    return numbers, np.append(starts, len(positions)), positions
+
+
+class BingoGame:
+    """ Bingo game which is played one drawn number at a time, for numbers which arrive over time.
+    Each drawn number is looked up in the inverted index, so only the positions where it occurs are marked. Hits are
+    counted for each row and column of each board, when a row or column has a count of 5 that board has bingo.
+    The sum of the unmarked numbers of each board is kept up to date, so scores take O(1) time.
     """
-    with open(file_path, "r") as f:
-        lines = [line.strip() for line in f]
 
-    numbers = lines[0].split(",")
-    boards = get_boards_info(lines)
+    def __init__(self, boards: np.array):
+        """
+        :param boards: Array with the numbers of each board
+        """
+        self.boards = boards
+        self.indexed_numbers, self.starts, self.positions = index_boards(boards)
+        self.row_hits = np.zeros(len(boards) * BOARD_SIZE, dtype=np.int8)
+        self.col_hits = np.zeros(len(boards) * BOARD_SIZE, dtype=np.int8)
+        self.unmarked_sums = boards.sum(axis=(1, 2))
+        self.has_bingo = np.zeros(len(boards), dtype=bool)
+        # Whether each indexed number has been drawn, so drawing a number again does not mark it twice
+        self.is_drawn = np.zeros(len(self.indexed_numbers), dtype=bool)
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> "BingoGame":
+        """ Create a game for the boards in input lines.
+
+        :param lines: Lines with the drawn numbers, followed by the lines with board numbers
+        :return: The bingo game
+        """
+        return cls(get_boards_info(lines))
+
+    def draw(self, number: int) -> List[Tuple[int, int]]:
+        """ Mark a drawn number on the boards which contain it and have no bingo yet.
+        Drawing a number that has been drawn before changes nothing, so repeated numbers can be replayed safely.
+
+        :param number: The drawn number
+        :return: Index and score of each board that got bingo with this number, ordered as in the input
+        """
+        i = np.searchsorted(self.indexed_numbers, number)
+        if i == len(self.indexed_numbers) or self.indexed_numbers[i] != number or self.is_drawn[i]:
+            return []
+        self.is_drawn[i] = True
+        marked = self.positions[self.starts[i] : self.starts[i + 1]]
+        board_ids = marked // BOARD_SIZE ** 2
+        # Boards with bingo are out of the game
+        in_game = ~self.has_bingo[board_ids]
+        marked, board_ids = marked[in_game], board_ids[in_game]
+
+        rows = marked // BOARD_SIZE
+        cols = board_ids * BOARD_SIZE + marked % BOARD_SIZE
+        if np.any(board_ids[1:] == board_ids[:-1]):
+            # The number occurs multiple times on a board, so the hits have to be accumulated
+            np.add.at(self.row_hits, rows, 1)
+            np.add.at(self.col_hits, cols, 1)
+            np.subtract.at(self.unmarked_sums, board_ids, number)
+        else:
+            self.row_hits[rows] += 1
+            self.col_hits[cols] += 1
+            self.unmarked_sums[board_ids] -= number
+
+        winners = np.unique(board_ids[(self.row_hits[rows] == BOARD_SIZE) | (self.col_hits[cols] == BOARD_SIZE)])
+        self.has_bingo[winners] = True
+        return [(int(board_id), int(score)) for board_id, score in zip(winners, self.unmarked_sums[winners] * number)]
+
+    def play(self, numbers: Iterable[int]) -> Iterator[Tuple[int, int, int]]:
+        """ Draw numbers as they arrive, until all boards have bingo.
+
+        :param numbers: Drawn numbers, in order
+        :return: Drawn number, index and score of each board when it gets bingo
+        """
+        for number in numbers:
+            for board_id, score in self.draw(number):
+                yield number, board_id, score
+            if self.has_bingo.all():
+                return
+
+    def snapshot(self, file_path: str):
+        """ Store the state of the game, the file is replaced at once so a snapshot is never partially written.
+
+        :param file_path: File path to store the game in
+        """
+        with open(f"{file_path}.tmp", "wb") as f:
+            np.savez(
+                f,
+                boards=self.boards,
+                row_hits=self.row_hits,
+                col_hits=self.col_hits,
+                unmarked_sums=self.unmarked_sums,
+                has_bingo=self.has_bingo,
+                is_drawn=self.is_drawn,
+            )
+        os.replace(f"{file_path}.tmp", file_path)
+
+    @classmethod
+    def restore(cls, file_path: str) -> "BingoGame":
+        """ Restore a game from a snapshot, the inverted index is created again from the boards.
+
+        :param file_path: File path the game is stored in
+        :return: The bingo game
+        """
+        with np.load(file_path) as snapshot:
+            game = cls(snapshot["boards"])
+            for name in ["row_hits", "col_hits", "unmarked_sums", "has_bingo", "is_drawn"]:
+                setattr(game, name, snapshot[name])
+        return game
+
+
+def play_bingo(numbers: np.array, boards: np.array) -> Tuple[int, int]:
+    """ Draw numbers until all boards have bingo, and score the first and last board to get bingo.
+    This takes time linear in the number of marked positions.
+
+    :param numbers: Drawn numbers, in order
+    :param boards: Array with the numbers of each board
+    :return: Scores of the first and last board to get bingo, when multiple boards get bingo on the same number they
+        are ordered as in the input
+    """
+    scores = [score for _, _, score in BingoGame(boards).play(numbers)]
+    return scores[0], scores[-1]
 
-    winner_score = 0
-    last_board = None
-    last_number = None
-    for number in numbers:
-        number = number.strip(" ")
-        for board in boards[:]:
-            # Get row and column while removing number from map
-            row, col = board["map"].pop(number, (None, None))
-            if row is None:
-                continue
 
-            for i, row_or_col in enumerate([row, col]):
-                # Increase count for the given row and column
-                board["counts"][i][row_or_col] += 1
+def read_bingo(file_path: str) -> Tuple[np.array, np.array]:
+    """ Read the drawn numbers and the boards
 
-                # Check for bingo
-                if board["counts"][i][row_or_col] == 5:
-                    boards.remove(board)
-                    if winner_score == 0:
-                        # Calculate score for the first board to get bingo
-                        sum_numbers = sum([int(key) for key in board["map"]])
-                        winner_score = sum_numbers * int(number)
+    :param file_path: File path of input data
+    :return: Drawn numbers, and array with the numbers of each board
+    """
+    with open(file_path, "r") as f:
+        lines = [line.strip() for line in f]
+    return np.array(lines[0].split(","), dtype=np.int64), get_boards_info(lines)
 
-                    if first_puzzle:
-                        return winner_score
 
-                    # Store info for potential last board to get bingo
-                    last_board = board
-                    last_number = number
-                    break
+def get_bingo_scores(file_path: str, first_puzzle: bool) -> int:
+    """ Given the numbers that are drawn and boards info, find the first and last board to get bingo.
 
-    loser_score = sum([int(key) for key in last_board["map"]]) * int(last_number)
-    return loser_score
+    :param file_path: File path of input data
+    :param first_puzzle: Whether the answer for the first or second puzzle is calculated
+    :return: Sum of remaining numbers of the winner (1st puzzle) or loser (2nd puzzle) board, times the last number.
+    """
+    winner_score, loser_score = play_bingo(*read_bingo(file_path))
+    return winner_score if first_puzzle else loser_score
 
 
 def main():
@@ -95,6 +191,27 @@ def main():
     second_answer = get_bingo_scores(file_path, first_puzzle=False)
     assert second_answer == 15561
 
+    # Both scores from a single pass, also with many copies of the boards
+    numbers, boards = read_bingo(file_path)
+    assert play_bingo(numbers, boards) == (87456, 15561)
+    assert play_bingo(numbers, np.tile(boards, (1000, 1, 1))) == (87456, 15561)
+
+    # Drawing numbers one at a time, with a restart halfway after which some numbers are drawn again
+    with open(file_path, "r") as f:
+        game = BingoGame.from_lines([line.strip() for line in f])
+    winners = [winner for number in numbers[:50] for winner in game.draw(number)]
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        game.snapshot(os.path.join(snapshot_dir, "4.npz"))
+        game = BingoGame.restore(os.path.join(snapshot_dir, "4.npz"))
+    winners += [winner for number in numbers[40:] for winner in game.draw(number)]
+    assert len(winners) == len(boards)
+    assert winners[0][1] == 87456 and winners[-1][1] == 15561
+
+    # Drawing the same number repeatedly marks it once
+    game = BingoGame(np.arange(1, 26).reshape(1, BOARD_SIZE, BOARD_SIZE))
+    assert all(game.draw(1) == [] for _ in range(BOARD_SIZE))
+    assert game.unmarked_sums[0] == 324
+
 
 if __name__ == "__main__":
     main()
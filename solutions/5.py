@@ -1,50 +1,401 @@
 # https://adventofcode.com/2021/day/5
 from utils.utils import get_input_path
+import bisect
+import itertools
 import numpy as np
 import re
+import tempfile
+from typing import Iterator, Optional, Tuple
 
+# Largest number of grid cells to count overlaps in a dense grid, above this overlaps are counted on sorted points
+MAX_DENSE_CELLS = 10 ** 8
 
-def find_hydrothermal_vents(file_path: str, first_puzzle: bool) -> int:
+
+def read_segments(file_path: str) -> np.array:
+    """ Read all line segments of hydrothermal vents at once
+
+    :param file_path: File path of input data
+    :return: Array with a row of x1, y1, x2, y2 for each line segment
+    """
+    with open(file_path, "r") as f:
+        numbers = re.findall(r"-?\d+", f.read())
+    return np.array(numbers, dtype=np.int64).reshape(-1, 4)
+
+
+def read_segment_chunks(file_path: str, chunk_size: int) -> Iterator[np.array]:
+    """ Read the line segments of hydrothermal vents in chunks, so the whole input never has to be in memory
+
+    :param file_path: File path of input data
+    :param chunk_size: Maximum number of line segments per chunk
+    :return: Arrays with a row of x1, y1, x2, y2 for each line segment in a chunk
+    """
+    with open(file_path, "r") as f:
+        for lines in iter(lambda: list(itertools.islice(f, chunk_size)), []):
+            numbers = re.findall(r"-?\d+", "".join(lines))
+            yield np.array(numbers, dtype=np.int64).reshape(-1, 4)
+
+
+def straight_segments(segments: np.array) -> np.array:
+    """ Get the horizontal and vertical line segments
+
+    :param segments: Array with a row of x1, y1, x2, y2 for each line segment
+    :return: Array with a row of x1, y1, x2, y2 for each horizontal or vertical line segment
+    """
+    return segments[(segments[:, 0] == segments[:, 2]) | (segments[:, 1] == segments[:, 3])]
+
+
+def rasterize_segments(segments: np.array) -> Tuple[np.array, np.array]:
+    """ Get all points covered by horizontal, vertical and diagonal line segments at once.
+    Each segment covers one point per step along its longest axis, moving -1, 0 or 1 along each axis per step.
+
+    :param segments: Array with a row of x1, y1, x2, y2 for each line segment
+    :return: The x and y coordinates of all covered points, once for each segment covering it
+    """
+    x1, y1, x2, y2 = segments.T
+    dx, dy = np.sign(x2 - x1), np.sign(y2 - y1)
+    lengths = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) + 1
+
+    # Step number of each point along its segment
+    segment_ids = np.repeat(np.arange(len(segments)), lengths)
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return x1[segment_ids] + dx[segment_ids] * steps, y1[segment_ids] + dy[segment_ids] * steps
+
+
+def count_overlaps(xs: np.array, ys: np.array) -> int:
+    """ Count the points that are covered at least twice.
+    The grid is sized from the covered points. Small grids count the points with bincount, for grids with a huge extent
+    the (x, y) pairs are sorted and counted instead, so memory only depends on the number of points and flat indices
+    can not overflow.
+
+    :param xs: X coordinates of the covered points
+    :param ys: Y coordinates of the covered points
+    :return: The number of points that are covered at least twice
+    """
+    if not len(xs):
+        return 0
+    x_min, y_min = int(xs.min()), int(ys.min())
+    width, height = int(xs.max()) - x_min + 1, int(ys.max()) - y_min + 1
+    if width * height <= MAX_DENSE_CELLS:
+        counts = np.bincount((ys - y_min) * width + (xs - x_min), minlength=width * height)
+    else:
+        _, counts = np.unique(np.stack([xs, ys], axis=1), axis=0, return_counts=True)
+    return int(np.count_nonzero(counts > 1))
+
+
+# Orientations of line segments
+HORIZONTAL, VERTICAL, DIAGONAL_UP, DIAGONAL_DOWN = range(4)
+
+
+def to_lines(segments: np.array) -> Tuple[np.array, np.array, np.array, np.array]:
+    """ Describe each line segment by its orientation, the key of the line it is on and its position range on that line.
+    The key is the constant y (horizontal), x (vertical), y - x (diagonal up) or x + y (diagonal down) of the line.
+    The position on the line is x, except for vertical lines where it is y.
+
+    :param segments: Array with a row of x1, y1, x2, y2 for each line segment
+    :return: Orientation, key, first position and last position of each line segment
+    """
+    x1, y1, x2, y2 = segments.T
+    dx, dy = np.sign(x2 - x1), np.sign(y2 - y1)
+    if np.any((dx != 0) & (dy != 0) & (np.abs(x2 - x1) != np.abs(y2 - y1))):
+        raise ValueError("Line segments must be horizontal, vertical or diagonal at 45 degrees")
+
+    orientations = np.select([dy == 0, dx == 0, dx == dy], [HORIZONTAL, VERTICAL, DIAGONAL_UP], DIAGONAL_DOWN)
+    keys = np.select([dy == 0, dx == 0, dx == dy], [y1, x1, y1 - x1], x1 + y1)
+    starts = np.where(orientations == VERTICAL, np.minimum(y1, y2), np.minimum(x1, x2))
+    ends = np.where(orientations == VERTICAL, np.maximum(y1, y2), np.maximum(x1, x2))
+    return orientations, keys, starts, ends
+
+
+def merge_intervals(keys: np.array, starts: np.array, ends: np.array, min_coverage: int) -> Tuple[np.array, ...]:
+    """ Merge the position ranges of collinear line segments into the intervals covered by at least a number of them.
+    Each range adds 1 to the coverage at its start and subtracts 1 after its end. Sorted by line and position, the
+    cumulative sum of these changes is the coverage between consecutive positions, which is 0 between lines.
+
+    :param keys: Key of the line of each line segment
+    :param starts: First position of each line segment
+    :param ends: Last position of each line segment
+    :param min_coverage: Minimum number of line segments covering the intervals
+    :return: Key, first position and last position of each interval, sorted by key and first position
+    """
+    if not len(keys):
+        return keys, starts, ends
+    lines = np.concatenate([keys, keys])
+    positions = np.concatenate([starts, ends + 1])
+    changes = np.concatenate([np.ones(len(keys), dtype=np.int64), -np.ones(len(keys), dtype=np.int64)])
+    order = np.lexsort((positions, lines))
+    lines, positions, changes = lines[order], positions[order], changes[order]
+
+    # Combine changes at the same position of a line
+    first = np.flatnonzero(np.r_[True, (lines[1:] != lines[:-1]) | (positions[1:] != positions[:-1])])
+    lines, positions = lines[first], positions[first]
+    coverage = np.cumsum(np.add.reduceat(changes, first))
+
+    # Find the runs of consecutive pieces between positions with enough coverage
+    covered = np.r_[False, coverage >= min_coverage, False]
+    run_starts = np.flatnonzero(covered[1:-1] & ~covered[:-2])
+    run_ends = np.flatnonzero(covered[1:-1] & ~covered[2:])
+    return lines[run_starts], positions[run_starts], positions[run_ends + 1] - 1
+
+
+class FenwickTree:
+    """ Binary indexed tree of counts, to add to a count, sum a prefix of the counts and find the index at which the
+    prefix sum exceeds a rank, all in O(log n) time.
+    """
+
+    def __init__(self, size: int):
+        """
+        :param size: Number of counts, all counts start at 0
+        """
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.top_step = 1 << size.bit_length()
+
+    def add(self, index: int, delta: int):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, stop: int) -> int:
+        """ Sum of the counts before an index
+
+        :param stop: Index after the last count to sum
+        :return: The sum of the counts
+        """
+        total = 0
+        while stop > 0:
+            total += self.tree[stop]
+            stop -= stop & -stop
+        return total
+
+    def find(self, rank: int) -> int:
+        """ Find the first index at which the prefix sum including that index is larger than a rank
+
+        :param rank: Rank to find, lower than the sum of all counts
+        :return: The index
+        """
+        index, step = 0, self.top_step
+        while step:
+            if index + step <= self.size and self.tree[index + step] <= rank:
+                index += step
+                rank -= self.tree[index]
+            step >>= 1
+        return index
+
+
+def find_crossings(horizontals: Tuple[np.array, ...], verticals: Tuple[np.array, ...]) -> Tuple[np.array, np.array]:
+    """ Find all crossings of horizontal and vertical intervals with a sweep-line over the u axis.
+    Horizontal intervals are added to the active set at their first u and removed after their last u. The active set
+    counts the active intervals at each distinct v in a Fenwick tree, so for each vertical interval, the active
+    horizontal intervals within its v range are found one at a time by their rank.
+    This takes O((n + k) log n) time for n intervals and k crossings.
+
+    :param horizontals: Constant v, first u and last u of each horizontal interval
+    :param verticals: Constant u, first v and last v of each vertical interval
+    :return: The u and v coordinates of all crossings
+    """
+    # Events sorted by u, with additions before lookups and lookups before removals at the same u
+    events = [(u, 0, v, v) for v, u, _ in zip(*horizontals)]
+    events += [(u, 1, v_start, v_end) for u, v_start, v_end in zip(*verticals)]
+    events += [(u, 2, v, v) for v, _, u in zip(*horizontals)]
+    events.sort()
+
+    vs = np.unique(horizontals[0]).tolist()
+    active = FenwickTree(len(vs))
+    crossings_u, crossings_v = [], []
+    for u, event_type, v_start, v_end in events:
+        if event_type == 1:
+            rank = active.prefix_sum(bisect.bisect_left(vs, v_start))
+            end_rank = active.prefix_sum(bisect.bisect_right(vs, v_end))
+            for rank in range(rank, end_rank):
+                crossings_u.append(u)
+                crossings_v.append(vs[active.find(rank)])
+        else:
+            active.add(bisect.bisect_left(vs, v_start), 1 if event_type == 0 else -1)
+    return np.array(crossings_u, dtype=np.int64), np.array(crossings_v, dtype=np.int64)
+
+
+def to_line_positions(xs: np.array, ys: np.array, orientation: int) -> Tuple[np.array, np.array]:
+    """ Get the key of the line with the given orientation through each point, and the position of the point on it
+
+    :param xs: X coordinates of the points
+    :param ys: Y coordinates of the points
+    :param orientation: Orientation of the lines
+    :return: Key of the line and position on the line of each point
+    """
+    keys = [ys, xs, ys - xs, xs + ys][orientation]
+    return keys, ys if orientation == VERTICAL else xs
+
+
+def count_overlaps_sweep(segments: np.array) -> int:
+    """ Count the points that are covered at least twice, without generating the covered points.
+    Collinear line segments are merged into intervals covered once and intervals covered at least twice. All points in
+    the intervals covered twice are counted. Intervals of different orientations are transformed to coordinates in
+    which they are horizontal and vertical, so their crossings can be found with a sweep-line. Crossings are counted
+    once, minus the number of intervals covered twice that they are in, as those are counted already.
+    This takes O((n + k) log n) time for n line segments and k crossings, independent of the coordinate range.
+
+    :param segments: Array with a row of x1, y1, x2, y2 for each line segment
+    :return: The number of points that are covered at least twice
+    """
+    orientations, keys, starts, ends = to_lines(segments)
+    covered, overlapped = [], []
+    for orientation in range(4):
+        in_orientation = orientations == orientation
+        lines = keys[in_orientation], starts[in_orientation], ends[in_orientation]
+        covered.append(merge_intervals(*lines, min_coverage=1))
+        overlapped.append(merge_intervals(*lines, min_coverage=2))
+    no_points = sum(int(np.sum(ends - starts + 1)) for _, starts, ends in overlapped)
+
+    # For each pair of orientations, transform the intervals to (u, v) coordinates in which the intervals of the first
+    # orientation are horizontal with v = key, and those of the second orientation vertical with u = key. For each
+    # orientation, the ranges of the other coordinate follow from its positions, and crossings are transformed back.
+    horizontal, vertical, diagonal_up, diagonal_down = covered
+    crossings = []
+    for h_lines, v_lines, to_u_range, to_v_range, to_xy in [
+        # u = x, v = y
+        (horizontal, vertical, lambda k, s, e: (s, e), lambda k, s, e: (s, e), lambda u, v: (u, v)),
+        # u = y - x, v = y
+        (
+            horizontal,
+            diagonal_up,
+            lambda k, s, e: (k - e, k - s),
+            lambda k, s, e: (s + k, e + k),
+            lambda u, v: (v - u, v),
+        ),
+        # u = x + y, v = y
+        (
+            horizontal,
+            diagonal_down,
+            lambda k, s, e: (s + k, e + k),
+            lambda k, s, e: (k - e, k - s),
+            lambda u, v: (u - v, v),
+        ),
+        # u = y - x, v = x
+        (vertical, diagonal_up, lambda k, s, e: (s - k, e - k), lambda k, s, e: (s, e), lambda u, v: (v, u + v)),
+        # u = x + y, v = x
+        (vertical, diagonal_down, lambda k, s, e: (s + k, e + k), lambda k, s, e: (s, e), lambda u, v: (v, u - v)),
+        # u = x + y, v = y - x
+        (
+            diagonal_up,
+            diagonal_down,
+            lambda k, s, e: (2 * s + k, 2 * e + k),
+            lambda k, s, e: (k - 2 * e, k - 2 * s),
+            lambda u, v: ((u - v) // 2, (u + v) // 2),
+        ),
+    ]:
+        us, vs = find_crossings((h_lines[0], *to_u_range(*h_lines)), (v_lines[0], *to_v_range(*v_lines)))
+        if h_lines is diagonal_up:
+            # Diagonals only cross at an integer point when u and v are both even or both odd
+            us, vs = us[(us - vs) % 2 == 0], vs[(us - vs) % 2 == 0]
+        crossings.append(np.stack(to_xy(us, vs), axis=1))
+
+    # Count each crossing once, minus the intervals covered twice that it is in
+    xs, ys = np.unique(np.concatenate(crossings), axis=0).T
+    no_points += len(xs)
+    for orientation, (overlap_keys, overlap_starts, overlap_ends) in enumerate(overlapped):
+        if not len(overlap_keys):
+            continue
+        point_keys, point_positions = to_line_positions(xs, ys, orientation)
+        # Encode keys and positions in one sortable number, intervals are sorted by key and first position already
+        all_keys, ranks = np.unique(np.concatenate([overlap_keys, point_keys]), return_inverse=True)
+        min_position = min(overlap_starts.min(), point_positions.min(initial=overlap_starts.min()))
+        span = max(overlap_ends.max(), point_positions.max(initial=overlap_ends.max())) - min_position + 1
+        codes = ranks * span + np.concatenate([overlap_starts, point_positions]) - min_position
+        interval_codes, point_codes = codes[: len(overlap_keys)], codes[len(overlap_keys) :]
+
+        indices = np.searchsorted(interval_codes, point_codes, side="right") - 1
+        valid = indices >= 0
+        indices = np.maximum(indices, 0)
+        in_overlap = (
+            valid & (overlap_keys[indices] == point_keys) & (overlap_ends[indices] >= point_positions)
+        )
+        no_points -= int(np.count_nonzero(in_overlap))
+    return no_points
+
+
+def count_overlaps_out_of_core(
+    file_path: str, first_puzzle: bool, max_memory: int = 2 ** 26, chunk_size: int = 1000
+) -> int:
+    """ Count the points that are covered at least twice, for grids which do not fit in memory.
+    The line segments are streamed from disk in chunks, twice: once to find the extent of the grid, and once to add the
+    points of each chunk to a memory-mapped grid on disk. Chunks are rasterized in groups of segments with a limited
+    number of points, and only the cells covered by a group are read and written, with counts saturating at 2 so a
+    uint8 grid suffices. The covered cells are counted in tiles of rows.
+    Memory is limited to about max_memory bytes, plus the points of one line segment, as segments are never split.
+
+    :param file_path: File path of input data
+    :param first_puzzle: Whether diagonal line segments are skipped
+    :param max_memory: Maximum number of bytes of the points of a group, or of the cells of a tile
+    :param chunk_size: Maximum number of line segments read at once
+    :return: The number of points that are covered at least twice
+    """
+
+    def chunks() -> Iterator[np.array]:
+        for chunk in read_segment_chunks(file_path, chunk_size):
+            yield straight_segments(chunk) if first_puzzle else chunk
+
+    extents = [
+        (chunk[:, ::2].min(), chunk[:, 1::2].min(), chunk[:, ::2].max(), chunk[:, 1::2].max())
+        for chunk in chunks()
+        if len(chunk)
+    ]
+    if not extents:
+        return 0
+    x_min, y_min = np.min(extents, axis=0)[:2]
+    x_max, y_max = np.max(extents, axis=0)[2:]
+    width, height = x_max - x_min + 1, y_max - y_min + 1
+    # Each point takes int64 x and y coordinates, a flat index, a sorted copy of the index, the unique indices, their
+    # counts and the new counts of the cells
+    max_points = max(1, max_memory // (7 * 8))
+    # Counting the cells of a tile takes a boolean per cell
+    tile_rows = max(1, max_memory // width)
+
+    with tempfile.TemporaryFile() as f:
+        grid = np.memmap(f, dtype=np.uint8, mode="w+", shape=(height, width))
+        cells = grid.reshape(-1)
+        for chunk in chunks():
+            x1, y1, x2, y2 = chunk.T
+            lengths = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) + 1
+            # Group the segments by the number of points before them
+            group_ids = (np.cumsum(lengths) - lengths) // max_points
+            for group in np.split(chunk, np.flatnonzero(np.diff(group_ids)) + 1):
+                xs, ys = rasterize_segments(group)
+                indices, counts = np.unique((ys - y_min) * width + (xs - x_min), return_counts=True)
+                cells[indices] = np.minimum(cells[indices] + counts, 2)
+        grid.flush()
+        no_points = sum(
+            int(np.count_nonzero(grid[start : start + tile_rows] == 2)) for start in range(0, height, tile_rows)
+        )
+        del cells, grid
+    return no_points
+
+
+def find_hydrothermal_vents(
+    file_path: str, first_puzzle: bool, sweep: bool = False, max_memory: Optional[int] = None
+) -> int:
     """ Count the number of overlapping points of hydrothermal vents.
-    A matrix is used to store the number of times a hydrothermal vent is found in that position.
-    All positions which are covered more than once are counter, for the first puzzle diagonal vents do not count.
+    All points of all vents are generated at once, and the number of times each point is covered is counted. For huge
+    coordinate ranges, the overlapping points can be counted with a sweep-line instead. For grids which do not fit in
+    memory, the vents can be streamed from disk into a grid on disk instead.
+    All positions which are covered more than once are counted, for the first puzzle diagonal vents do not count.
 
     :param file_path: File path of input data
     :param first_puzzle: Whether the answer for the first or second puzzle is calculated
+    :param sweep: Whether to count with a sweep-line instead of generating all points
+    :param max_memory: Maximum number of bytes of grid counts in memory, counts in a grid on disk if given
     :return: The number of points where are least two lines overlap
     """
-    matrix = np.zeros(shape=(1000, 1000), dtype=int)
-    with open(file_path, "r") as f:
-        for line in f:
-            coordinates = re.split(" -> |,", line.strip("\n"))
-            x1, y1, x2, y2 = map(int, coordinates)
-
-            # vertical
-            if x1 == x2:
-                y = sorted([y1, y2])
-                matrix[y[0]: y[1]+1, x1] += 1
-            # horizontal
-            elif y1 == y2:
-                x = sorted([x1, x2])
-                matrix[y1, x[0]: x[1]+1] += 1
-            # diagonal
-            else:
-                if first_puzzle:
-                    continue
-                # Sort based on x values, point a is to the left of point b
-                point_a, point_b = sorted([(x1, y1), (x2, y2)], key=lambda i: i[0])
-                x1, y1, x2, y2 = point_a[0], point_a[1], point_b[0], point_b[1]
-                # Diagonal is going up
-                if y1 > y2:
-                    matrix_subset = matrix[y2:y1+1, x1:x2+1]
-                    np.fill_diagonal(np.flipud(matrix_subset),
-                                     np.flipud(matrix_subset).diagonal() + 1)
-                # Diagonal is going down
-                else:
-                    matrix_subset = matrix[y1:y2+1, x1:x2+1]
-                    np.fill_diagonal(matrix_subset, matrix_subset.diagonal() + 1)
-
-    return len(matrix[matrix > 1])
+    if max_memory is not None:
+        return count_overlaps_out_of_core(file_path, first_puzzle, max_memory)
+
+    segments = read_segments(file_path)
+    if first_puzzle:
+        segments = straight_segments(segments)
+
+    if sweep:
+        return count_overlaps_sweep(segments)
+    return count_overlaps(*rasterize_segments(segments))
 
 
 def main():
@@ -55,6 +406,10 @@ def main():
     assert test_first_answer == 5
     test_second_answer = find_hydrothermal_vents(test_file_path, first_puzzle=False)
     assert test_second_answer == 12
+    assert find_hydrothermal_vents(test_file_path, first_puzzle=True, sweep=True) == 5
+    assert find_hydrothermal_vents(test_file_path, first_puzzle=False, sweep=True) == 12
+    assert find_hydrothermal_vents(test_file_path, first_puzzle=True, max_memory=100) == 5
+    assert find_hydrothermal_vents(test_file_path, first_puzzle=False, max_memory=100) == 12
 
     # Real input
     file_path = get_input_path("5.txt")
@@ -63,6 +418,20 @@ def main():
     assert first_answer == 6841
     second_answer = find_hydrothermal_vents(file_path, first_puzzle=False)
     assert second_answer == 19258
+    assert find_hydrothermal_vents(file_path, first_puzzle=True, sweep=True) == 6841
+    assert find_hydrothermal_vents(file_path, first_puzzle=False, sweep=True) == 19258
+    assert find_hydrothermal_vents(file_path, first_puzzle=True, max_memory=2 ** 16) == 6841
+    assert find_hydrothermal_vents(file_path, first_puzzle=False, max_memory=2 ** 16) == 19258
+
+    # With half of the vents shifted far away, the points are counted without a dense grid
+    segments = read_segments(file_path)
+    expected = count_overlaps(*rasterize_segments(segments[::2])) + count_overlaps(*rasterize_segments(segments[1::2]))
+    segments[::2] += 10 ** 9
+    assert count_overlaps(*rasterize_segments(segments)) == expected
+    assert count_overlaps_sweep(segments) == expected
+    # Also when the extent is too large for flat indices of a grid
+    segments[::2] += 5 * 10 ** 9
+    assert count_overlaps(*rasterize_segments(segments)) == expected
 
 
 if __name__ == "__main__":
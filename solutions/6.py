@@ -1,21 +1,90 @@
 # https://adventofcode.com/2021/day/6
 from utils.utils import get_input_path
 from collections import OrderedDict, Counter
+from typing import Callable, List, Optional
 
+# Each day fish with age 0 reset to age 6 and create a new fish with age 8, all other fish get 1 day younger.
+# The characteristic polynomial of this daily transition is x^9 - x^2 - 1, so the total number of fish on day n follows
+# the linear recurrence fish(n) = fish(n - 7) + fish(n - 9).
+RECURRENCE_ORDER = 9
 
-def count_lanternfish(input_path: str, days: int) -> int:
+# Cached powers of x modulo the recurrence polynomial, the i-th item is x^(2^i) as list of coefficients
+_x_powers = [[0, 1] + [0] * (RECURRENCE_ORDER - 2)]
+
+
+def multiply_polynomials(a: List[int], b: List[int]) -> List[int]:
+    """ Multiply two polynomials modulo the recurrence polynomial x^9 - x^2 - 1
+
+    :param a: Coefficients of the first polynomial, lowest degree first
+    :param b: Coefficients of the second polynomial, lowest degree first
+    :return: Coefficients of the product
+    """
+    product = [0] * (2 * RECURRENCE_ORDER - 1)
+    for i, a_coefficient in enumerate(a):
+        if a_coefficient:
+            for j, b_coefficient in enumerate(b):
+                product[i + j] += a_coefficient * b_coefficient
+    # Reduce the highest degrees first, using x^k = x^(k - 7) + x^(k - 9)
+    for k in range(2 * RECURRENCE_ORDER - 2, RECURRENCE_ORDER - 1, -1):
+        product[k - 7] += product[k]
+        product[k - 9] += product[k]
+    return product[:RECURRENCE_ORDER]
+
+
+def read_fish_ages(input_path: str) -> List[int]:
+    """ Read the initial fish and count them by age
+
+    :param input_path: File path of input data
+    :return: Number of fish for each age from 0 to 8
+    """
+    with open(input_path, "r") as f:
+        initial_fish = Counter(map(int, f.read().split(",")))
+    return [initial_fish[age] for age in range(9)]
+
+
+def count_lanternfish_batch(input_path: str, days: List[int]) -> List[int]:
+    """ Count the number of lanternfish after each of the given numbers of days.
+    Using the linear recurrence, the number of fish after x days is a combination of the number of fish on the first 9
+    days, with the coefficients of x^days modulo the recurrence polynomial. That power is calculated by repeated
+    squaring with exact integers, squares are cached and reused for all numbers of days.
+
+    :param input_path: File path of input data
+    :param days: Numbers of days
+    :return: How many lanternfish there are after each given number of days
+    """
+    # Simulate the first days to get the initial values of the recurrence
+    ages = read_fish_ages(input_path)
+    initial_counts = []
+    for _ in range(RECURRENCE_ORDER):
+        initial_counts.append(sum(ages))
+        ages = ages[1:7] + [ages[7] + ages[0], ages[8], ages[0]]
+
+    counts = []
+    for no_days in days:
+        coefficients = [1] + [0] * (RECURRENCE_ORDER - 1)
+        for i in range(no_days.bit_length()):
+            if i == len(_x_powers):
+                _x_powers.append(multiply_polynomials(_x_powers[-1], _x_powers[-1]))
+            if no_days >> i & 1:
+                coefficients = multiply_polynomials(coefficients, _x_powers[i])
+        counts.append(sum(c * count for c, count in zip(coefficients, initial_counts)))
+    return counts
+
+
+def count_lanternfish(input_path: str, days: int, trace: Optional[Callable[[int, OrderedDict], None]] = None) -> int:
     """ Count the number of lanternfish after x number of days
 
     :param input_path: File path of input data
     :param days: Number of days
+    :param trace: Optional callback that is called with the day and fish grouped by age, after each simulated day
     :return: How many lanternfish there are after given number of days
     """
-    with open(input_path, "r") as f:
-        initial_fish = list(map(int, f.read().split(",")))
+    if trace is None:
+        return count_lanternfish_batch(input_path, [days])[0]
 
     # Create initial dict with fish grouped by age
     grouped_fish = OrderedDict({age: 0 for age in range(10)})
-    grouped_fish.update(Counter(initial_fish))
+    grouped_fish.update(enumerate(read_fish_ages(input_path)))
 
     for day in range(1, days + 1):
         # Create new fishes with age 9, so fish with age 8 will be set to this number below
@@ -24,7 +93,7 @@ def count_lanternfish(input_path: str, days: int) -> int:
         grouped_fish[7] += grouped_fish[0]
         for age in range(9):
             grouped_fish[age] = grouped_fish[age+1]
-        print(f"After {day} {'day' if day==1 else 'days'}: {grouped_fish}")
+        trace(day, grouped_fish)
     return sum(grouped_fish[age] for age in range(9))
 
 
@@ -36,6 +105,10 @@ def main():
     assert test_first_answer == 5934
     test_second_answer = count_lanternfish(test_file_path, days=256)
     assert test_second_answer == 26984457539
+    assert count_lanternfish_batch(test_file_path, [0, 18, 80, 256]) == [5, 26, 5934, 26984457539]
+    traced_days = []
+    assert count_lanternfish(test_file_path, days=18, trace=lambda day, _: traced_days.append(day)) == 26
+    assert traced_days == list(range(1, 19))
 
     # Real input
     file_path = get_input_path("6.txt")
@@ -1,35 +1,139 @@
 # https://adventofcode.com/2021/day/7
 from utils.utils import get_input_path
-import statistics
+import numpy as np
+from typing import Callable, Tuple
+
+
+def read_positions(input_path: str) -> np.array:
+    """ Read the horizontal positions of all crabs at once
+
+    :param input_path: File path of input data
+    :return: Array of horizontal positions
+    """
+    with open(input_path, "r") as f:
+        return np.array(f.read().split(","), dtype=np.int64)
+
+
+def linear_cost(distances: np.array) -> np.array:
+    """ Fuel cost of moving crabs, 1 move == 1 fuel
+
+    :param distances: Distances each crab moves
+    :return: Fuel cost of each crab
+    """
+    return distances
+
+
+def triangular_cost(distances: np.array) -> np.array:
+    """ Fuel cost of moving crabs, the nth move costs n fuel
+
+    :param distances: Distances each crab moves
+    :return: Fuel cost of each crab
+    """
+    return distances * (distances + 1) // 2
+
+
+class FuelCosts:
+    """ Total fuel costs of all crabs moving to a position, calculated from prefix sums over the sorted positions.
+    Sorting takes O(n log n) time once, after which each position takes O(log n) time to find the crabs left of it.
+    Sums which could overflow 64-bit integers are kept as Python integers.
+    """
+
+    def __init__(self, positions: np.array):
+        self.positions = np.sort(positions)
+        self.no_crabs = len(positions)
+        max_abs = int(np.abs(self.positions).max(initial=0))
+        dtype = np.int64 if self.no_crabs * max_abs < 2 ** 63 else object
+        self.prefix_sums = np.concatenate([[0], np.cumsum(self.positions.astype(dtype))])
+        self.sum = int(self.prefix_sums[-1])
+        dtype = np.int64 if self.no_crabs * max_abs ** 2 < 2 ** 63 else object
+        self.sum_of_squares = int(np.sum(self.positions.astype(dtype) ** 2))
+
+    def linear(self, position: int) -> int:
+        """ Total fuel cost of all crabs moving to a position, 1 move == 1 fuel
+
+        :param position: Horizontal position to move to
+        :return: Total fuel cost
+        """
+        no_left = int(np.searchsorted(self.positions, position))
+        left_sum = int(self.prefix_sums[no_left])
+        return position * no_left - left_sum + (self.sum - left_sum) - position * (self.no_crabs - no_left)
+
+    def squared(self, position: int) -> int:
+        """ Total of the squared distances of all crabs to a position
+
+        :param position: Horizontal position to move to
+        :return: Total squared distance
+        """
+        return self.sum_of_squares - 2 * position * self.sum + self.no_crabs * position ** 2
+
+    def triangular(self, position: int) -> int:
+        """ Total fuel cost of all crabs moving to a position, the nth move costs n fuel.
+        The nth triangular number is (n^2 + n) / 2, so this follows from the squared and linear distances.
+
+        :param position: Horizontal position to move to
+        :return: Total fuel cost
+        """
+        return (self.squared(position) + self.linear(position)) // 2
+
+
+def find_minimum(cost: Callable[[int], int], low: int, high: int) -> Tuple[int, int]:
+    """ Find the position with the lowest cost of a convex cost function, using ternary search.
+    As the cost function is convex, the cost only stops decreasing at a minimum. Comparing the costs of two adjacent
+    positions discards half of the range each step, so this takes O(log(high - low)) evaluations.
+
+    :param cost: Convex function of the cost of a position
+    :param low: Lowest position to search
+    :param high: Highest position to search
+    :return: Position with the lowest cost and its cost
+    """
+    while low < high:
+        middle = (low + high) // 2
+        if cost(middle) <= cost(middle + 1):
+            high = middle
+        else:
+            low = middle + 1
+    return low, cost(low)
 
 
 def calculate_fuel_cost_median(input_path: str) -> int:
-    """ Calculate total fuel costs for all crabs to move horizontally to optimal position, 1 move == 1 fuel
+    """ Calculate total fuel costs for all crabs to move horizontally to optimal position, 1 move == 1 fuel.
+    The median is the optimal position, which is selected in O(n) time without sorting the positions.
 
     :param input_path: File path of input data
     :return: Total fuel cost
     """
-    with open(input_path, "r") as f:
-        positions = list(map(int, f.read().split(",")))
-    optimal_position = statistics.median(positions)
-    return sum([abs(pos - optimal_position) for pos in positions])
+    positions = read_positions(input_path)
+    middle = len(positions) // 2
+    optimal_position = np.partition(positions, middle)[middle]
+    return int(np.abs(positions - optimal_position).sum())
 
 
 def calculate_fuel_cost_triangular(input_path: str) -> int:
     """ Calculate total fuel costs for all crabs to move horizontally to optimal position, costs of moving to the
     optimal position are calculated using the nth triangular number.
+    The optimal position is within 1/2 of the mean position, so only the integer positions around the mean are checked.
 
     :param input_path: File path of input data
     :return: Total fuel cost
     """
-    with open(input_path, "r") as f:
-        positions = list(map(int, f.read().split(",")))
+    costs = FuelCosts(read_positions(input_path))
+    mean = costs.sum // costs.no_crabs
+    return min(costs.triangular(position) for position in range(mean - 1, mean + 3))
+
+
+def calculate_fuel_cost(input_path: str, fuel_cost: Callable[[np.array], np.array]) -> int:
+    """ Calculate total fuel costs for all crabs to move horizontally to optimal position, for any fuel cost which is
+    convex in the distance moved. The total fuel cost is then convex in the position, so ternary search finds the
+    optimal position in O(n log(max - min)) time.
 
-    lowest_cost = None
-    for x in range(max(positions)):
-        fuel_cost = sum([(abs(pos - x) * (abs(pos - x) + 1) // 2) for pos in positions])
-        if not lowest_cost or fuel_cost < lowest_cost:
-            lowest_cost = fuel_cost
+    :param input_path: File path of input data
+    :param fuel_cost: Function of the fuel cost of each crab, given the distance each crab moves
+    :return: Total fuel cost
+    """
+    positions = read_positions(input_path)
+    _, lowest_cost = find_minimum(
+        lambda x: int(fuel_cost(np.abs(positions - x)).sum()), int(positions.min()), int(positions.max())
+    )
     return lowest_cost
 
 
@@ -41,6 +145,8 @@ def main():
     assert test_first_answer == 37
     test_second_answer = calculate_fuel_cost_triangular(test_file_path)
     assert test_second_answer == 168
+    assert calculate_fuel_cost(test_file_path, linear_cost) == 37
+    assert calculate_fuel_cost(test_file_path, triangular_cost) == 168
 
     # Real input
     file_path = get_input_path("7.txt")
@@ -49,6 +155,17 @@ def main():
     assert first_answer == 357353
     second_answer = calculate_fuel_cost_triangular(file_path)
     assert second_answer == 104822130
+    assert calculate_fuel_cost(file_path, linear_cost) == 357353
+    assert calculate_fuel_cost(file_path, triangular_cost) == 104822130
+
+    # Prefix sums give the same costs as summing over all crabs, also when 64-bit sums would overflow
+    positions = read_positions(file_path)
+    costs = FuelCosts(positions)
+    for x in range(positions.min(), positions.max() + 1, 97):
+        assert costs.linear(x) == int(linear_cost(np.abs(positions - x)).sum())
+        assert costs.triangular(x) == int(triangular_cost(np.abs(positions - x)).sum())
+    costs = FuelCosts(positions * 10 ** 9)
+    assert costs.triangular(0) == sum(int(x) * (int(x) + 1) // 2 for x in positions * 10 ** 9)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,34 @@
 # https://adventofcode.com/2021/day/8
 from utils.utils import get_input_path
+import numpy as np
+from typing import Tuple
+
+# Number of signal patterns and output digits of each display
+NO_SIGNALS, NO_OUTPUTS = 10, 4
+# Bit of each segment a-g, for each byte of input data
+SEGMENT_BITS = np.zeros(256, dtype=np.uint8)
+SEGMENT_BITS[ord("a") : ord("g") + 1] = 1 << np.arange(7)
+# Number of segments that are on for each 7-bit pattern
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(2 ** 7)], dtype=np.uint8)
+
+
+def read_displays(input_path: str) -> Tuple[np.array, np.array]:
+    """ Read all displays at once, encoding each pattern as a 7-bit mask with a bit for each of the segments a-g.
+    The masks are calculated on the raw bytes, by OR-ing the bits of the bytes from the start of each word until the
+    start of the next word together.
+
+    :param input_path: File path of input data
+    :return: Array with the 10 signal patterns of each display, and array with the 4 output patterns of each display
+    """
+    with open(input_path, "rb") as f:
+        bits = SEGMENT_BITS[np.frombuffer(f.read(), dtype=np.uint8)]
+    # A word starts at each letter which follows a separator, separators have no bits so they do not change the masks
+    is_letter = bits.astype(bool)
+    is_start = is_letter.copy()
+    is_start[1:] &= ~is_letter[:-1]
+    masks = np.bitwise_or.reduceat(bits, np.flatnonzero(is_start))
+    masks = masks.reshape(-1, NO_SIGNALS + NO_OUTPUTS)
+    return masks[:, :NO_SIGNALS], masks[:, NO_SIGNALS:]
 
 
 def count_easy_digits(input_path: str) -> int:
@@ -9,15 +38,48 @@ def count_easy_digits(input_path: str) -> int:
     :param input_path: File path of input data
     :return: Count of digits 1, 4, 7 and 8.
     """
-    with open(input_path, "r") as f:
-        displays = [line.strip("\n").split(" | ") for line in f]
-    count = 0
-    for display in displays:
-        output = display[1].split(" ")
-        for digit in output:
-            if len(digit) in [2, 4, 3, 7]:
-                count += 1
-    return count
+    _, outputs = read_displays(input_path)
+    lengths = np.bincount(POPCOUNT[outputs].ravel(), minlength=8)
+    return int(lengths[[2, 4, 3, 7]].sum())
+
+
+def decode_displays(signals: np.array, outputs: np.array) -> np.array:
+    """ Decode the output digits of all displays at once.
+    Digits 1, 4, 7 and 8 have a unique number of segments. The others are told apart by their segments in common with
+    the masks of 1, 4 and 7 of the same display:
+    - Digits 2, 3, 5 have 5 segments, 3 contains 1, 5 has 3 segments in common with 4 and 2 has 2 in common with 4.
+    - Digits 0, 6, 9 have 6 segments, 9 contains 4, 0 contains 7 and 6 contains neither.
+
+    :param signals: Array with the 10 signal patterns of each display
+    :param outputs: Array with the 4 output patterns of each display
+    :return: Array with the 4 output digits of each display
+    """
+    signal_lengths = POPCOUNT[signals]
+    one, four, seven = [
+        np.take_along_axis(signals, np.argmax(signal_lengths == length, axis=1)[:, None], axis=1)
+        for length in [2, 4, 3]
+    ]
+
+    lengths = POPCOUNT[outputs]
+    contains_one = outputs & one == one
+    contains_four = outputs & four == four
+    contains_seven = outputs & seven == seven
+    in_common_with_four = POPCOUNT[outputs & four]
+    return np.select(
+        [
+            lengths == 2,
+            lengths == 3,
+            lengths == 4,
+            lengths == 7,
+            (lengths == 5) & contains_one,
+            (lengths == 5) & (in_common_with_four == 3),
+            lengths == 5,
+            contains_four,
+            contains_seven,
+        ],
+        [1, 7, 4, 8, 3, 5, 2, 9, 0],
+        default=6,
+    )
 
 
 def calculate_sum(input_path: str) -> int:
@@ -30,45 +92,8 @@ def calculate_sum(input_path: str) -> int:
     :param input_path: File path of input data
     :return: Sum of output for each line
     """
-    with open(input_path, "r") as f:
-        displays = [line.strip("\n").split(" | ") for line in f]
-
-    sum_out = 0
-    for display in displays:
-        signals, output = display[0].split(" "), display[1].split(" ")
-
-        sorted_signals = sorted([set(s) for s in signals], key=len)
-        digits = {1: sorted_signals[0],
-                  4: sorted_signals[2],
-                  7: sorted_signals[1],
-                  8: sorted_signals[9]}
-        # Digits 0, 6, 9 all have length 6
-        for signal in sorted_signals[6:9]:
-            if digits[4] <= signal:
-                digits[9] = signal
-            else:
-                if digits[7] <= signal:
-                    digits[0] = signal
-                else:
-                    digits[6] = signal
-        # Digits 2, 3, 5 all have length 5
-        for signal in sorted_signals[3:6]:
-            if digits[1] <= signal:
-                digits[3] = signal
-            else:
-                if signal <= digits[6]:
-                    digits[5] = signal
-                else:
-                    digits[2] = signal
-
-        # Recreate digits dict, swapping key and values
-        digits = {"".join(sorted(v)): k for k, v in digits.items()}
-        # Look up digit based on given signal and create 4 digit number
-        out = ""
-        for signal in output:
-            out += str(digits["".join(sorted(signal))])
-        sum_out += int(out)
-    return sum_out
+    digits = decode_displays(*read_displays(input_path))
+    return int((digits @ 10 ** np.arange(NO_OUTPUTS - 1, -1, -1)).sum())
 
 
 def main():
@@ -1,34 +1,79 @@
 # https://adventofcode.com/2021/day/9
+import os
+import tempfile
+from typing import Tuple
+
 import numpy as np
 from scipy.ndimage import label
 
-from utils.utils import get_input_path
+from utils.utils import get_input_path, read_digit_grid
 
+# Height of the borders of basins
+MAX_HEIGHT = 9
 
-def sum_risk_levels(input_path: str) -> int:
-    """ Find the low points in a heightmap and calculate the total risk level.
+
+def find_low_points(heightmap: np.array) -> np.array:
+    """ Find the locations which are lower than all adjacent locations.
+    The heightmap is padded once with a height above all heights, so each neighbor is a shifted view of the padded map.
+
+    :param heightmap: 2D numpy array with the height of each location
+    :return: Boolean 2D numpy array, which is True for low points
+    """
+    padded = np.pad(heightmap, 1, constant_values=MAX_HEIGHT + 1)
+    center = padded[1:-1, 1:-1]
+    return (
+        (center < padded[:-2, 1:-1])
+        & (center < padded[2:, 1:-1])
+        & (center < padded[1:-1, :-2])
+        & (center < padded[1:-1, 2:])
+    )
+
+
+def risk_level(heightmap: np.array) -> int:
+    """ Calculate the total risk level of the low points in a heightmap.
     The risk level of a low point is 1 plus its height.
 
-    :param input_path: File path of input data
+    :param heightmap: 2D numpy array with the height of each location
     :return: Sum of the risk levels of all low points.
     """
-    heightmap = np.genfromtxt(input_path, delimiter=1, dtype=int)
-    rows, columns = heightmap.shape
+    low_points = heightmap[find_low_points(heightmap)]
+    return int(low_points.sum(dtype=np.int64)) + len(low_points)
+
+
+def largest_basins_product(heightmap: np.array) -> int:
+    """ Find the three largest basins and multiply their sizes.
+    A basin consists of connected locations, they are bordered by 9's. The basins are labeled once, and the three
+    largest sizes are selected without sorting all sizes.
+
+    :param heightmap: 2D numpy array with the height of each location
+    :return: Multiplied size of 3 largest basins
+    """
+    # Create labels, each basin is labeled with a different number and 9's are labeled 0
+    labels, _ = label(heightmap < MAX_HEIGHT, output=np.int32)
+    sizes = np.bincount(labels.ravel())[1:]
+    no_largest = min(3, len(sizes))
+    return int(np.prod(np.partition(sizes, -no_largest)[-no_largest:], dtype=np.int64))
 
-    left = np.diff(heightmap, axis=1)
-    left = np.append(left, np.full((rows, 1), 1), axis=1)
 
-    right = np.diff(np.fliplr(heightmap), axis=1)
-    right = np.insert(np.fliplr(right), 0, [1], axis=1)
+def analyze_heightmap(input_path: str) -> Tuple[int, int]:
+    """ Calculate the total risk level and the product of the three largest basin sizes, from a single load of the
+    heightmap.
 
-    down = np.diff(np.flipud(heightmap), axis=0)
-    down = np.insert(np.flipud(down), 0, np.full((1, columns), 1), axis=0)
+    :param input_path: File path of input data
+    :return: Sum of the risk levels of all low points, and multiplied size of 3 largest basins
+    """
+    heightmap = read_digit_grid(input_path)
+    return risk_level(heightmap), largest_basins_product(heightmap)
 
-    up = np.diff(heightmap, axis=0)
-    up = np.append(up, np.full((1, columns), 1), axis=0)
 
-    low_points = heightmap[np.logical_and(down > 0, up > 0) & np.logical_and(left > 0, right > 0)]
-    return sum(low_points) + len(low_points)
+def sum_risk_levels(input_path: str) -> int:
+    """ Find the low points in a heightmap and calculate the total risk level.
+    The risk level of a low point is 1 plus its height.
+
+    :param input_path: File path of input data
+    :return: Sum of the risk levels of all low points.
+    """
+    return risk_level(read_digit_grid(input_path))
 
 
 def find_basins(input_path: str) -> int:
@@ -38,13 +83,7 @@ def find_basins(input_path: str) -> int:
     :param input_path: File path of input data
     :return: Multiplied size of 3 largest basins
     """
-    heightmap = np.genfromtxt(input_path, delimiter=1, dtype=int)
-    # Restructure array, set 9's to 0's and all other values to 1
-    binary_heightmap = np.abs(np.clip(heightmap, 8, 9) - 9)
-    # Create labels, each segment is labeled with a different number
-    labels, no_labels = label(binary_heightmap)
-    # Count size of three largest basins (largest label is ignored, these are the original 9's)
-    return np.prod((sorted(np.bincount(np.reshape(labels, labels.size)))[-4:-1]))
+    return largest_basins_product(read_digit_grid(input_path))
 
 
 def main():
@@ -63,6 +102,15 @@ def main():
     assert first_answer == 633
     second_answer = find_basins(file_path)
     assert second_answer == 1050192
+    assert analyze_heightmap(file_path) == (633, 1050192)
+
+    # Windows line endings, and fewer than three basins
+    with tempfile.TemporaryDirectory() as temp_dir:
+        crlf_file_path = os.path.join(temp_dir, "9.txt")
+        with open(test_file_path, "r") as f, open(crlf_file_path, "w", newline="\r\n") as crlf_file:
+            crlf_file.write(f.read())
+        assert analyze_heightmap(crlf_file_path) == (15, 1134)
+    assert largest_basins_product(np.array([[1, 9, 2]])) == 1
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 import os
 import pathlib
 
+import numpy as np
+
 import input
 import input_test
 
@@ -15,3 +17,17 @@ def get_input_path(file_name: str, test: bool = False) -> str:
     init_file = input_test.__file__ if test else input.__file__
     input_dir_path = pathlib.Path(init_file).resolve().parent
     return os.path.join(input_dir_path, file_name)
+
+
+def read_digit_grid(file_path: str) -> np.array:
+    """ Read a file of equally long rows of digits at once, as one byte per digit.
+    Rows are split on any whitespace, so line endings and trailing spaces do not matter.
+
+    :param file_path: File path of input data
+    :return: 2D numpy array with the digits of each row
+    """
+    with open(file_path, "rb") as f:
+        rows = f.read().split()
+    if len({len(row) for row in rows}) > 1:
+        raise ValueError(f"Rows of {file_path} do not have the same length")
+    return np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), -1) - ord("0")